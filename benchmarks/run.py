@@ -0,0 +1,400 @@
+# -*- coding: utf-8 -*-
+"""
+benchmarks.run
+~~~~
+Micro-benchmarks for header generation and report ingestion.
+
+    $ python benchmarks/run.py --output bench.json
+    $ python benchmarks/run.py --baseline bench.json --max-regression 0.25
+    $ python benchmarks/run.py --thresholds benchmarks/thresholds.json
+
+Results are written as JSON, with the time per operation in microseconds. The
+run fails when a benchmark is slower than its threshold, or slower than the
+baseline by more than the allowed regression.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from flask import Flask, Response, abort
+from werkzeug.datastructures import Headers
+from werkzeug.test import EnvironBuilder
+
+from flask_csp import CSP, csp
+from flask_csp.constants import FetchRestriction, Directive
+from flask_csp.core import CompiledPolicy, set_csp_header
+from flask_csp.policy import is_allowed_enum_value, load_directive, parse_directives, parse_policy
+from flask_csp.utils import get_submitted_report
+
+
+BENCHMARKS = {}
+
+SMALL_POLICY = {
+    'default_src': FetchRestriction.SELF,
+    'report_uri': 'https://example.com/csp/receiver',
+}
+
+LARGE_POLICY = {
+    'default_src': FetchRestriction.SELF,
+    'script_src': [FetchRestriction.SELF, FetchRestriction.STRICT_DYNAMIC] + [
+        f'https://cdn{i}.example.com' for i in range(50)
+    ],
+    'style_src': [FetchRestriction.SELF, FetchRestriction.UNSAFE_INLINE] + [
+        f'*.static{i}.example.com' for i in range(25)
+    ],
+    'img_src': [FetchRestriction.SELF, FetchRestriction.DATA, FetchRestriction.HTTPS],
+    'connect_src': [f'wss://socket{i}.example.com' for i in range(10)],
+    'frame_ancestors': FetchRestriction.NONE,
+    'sandbox': ['allow-forms', 'allow-scripts', 'allow-same-origin'],
+    'upgrade_insecure_requests': True,
+    'report_uri': 'https://example.com/csp/receiver',
+    'report_to': {'name': 'csp-endpoint', 'endpoints': ['https://example.com/csp/receiver']},
+}
+
+CSP_REPORT = {
+    'csp-report': {
+        'document-uri': 'http://example.com/signup.html',
+        'referrer': '',
+        'blocked-uri': 'http://example.com/css/style.css',
+        'violated-directive': 'style-src cdn.example.com',
+        'effective-directive': 'style-src',
+        'original-policy': "default-src 'none'; style-src cdn.example.com; report-uri /_/csp-reports",
+        'disposition': 'report',
+        'status-code': 200,
+    },
+}
+
+
+class Skip(Exception):
+    """Raised by a benchmark's setup when it cannot run in this environment"""
+
+
+def benchmark(name):
+    """
+    Registers a benchmark. The decorated function sets it up and returns the
+    callable that is timed.
+    """
+
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+@benchmark('set_csp_header.small')
+def bench_set_csp_header_small():
+    return lambda: set_csp_header(Response(''), SMALL_POLICY)
+
+
+@benchmark('set_csp_header.large')
+def bench_set_csp_header_large():
+    return lambda: set_csp_header(Response(''), LARGE_POLICY)
+
+
+@benchmark('compiled_policy.small')
+def bench_compiled_policy_small():
+    policy = CompiledPolicy(SMALL_POLICY)
+    return lambda: policy.apply(Response(''))
+
+
+@benchmark('compiled_policy.large')
+def bench_compiled_policy_large():
+    policy = CompiledPolicy(LARGE_POLICY)
+    return lambda: policy.apply(Response(''))
+
+
+@benchmark('load_directive')
+def bench_load_directive():
+    sources = LARGE_POLICY['script_src']
+    return lambda: load_directive('script-src', *sources)
+
+
+@benchmark('is_allowed_enum_value')
+def bench_is_allowed_enum_value():
+    values = [item.value for item in Directive] + [item.name for item in Directive]
+
+    def run():
+        for value in values:
+            is_allowed_enum_value(Directive, value)
+
+    return run
+
+
+@benchmark('parse_policy')
+def bench_parse_policy():
+    value = CompiledPolicy(LARGE_POLICY).headers[0][1]
+
+    def run():
+        parse_directives.cache_clear()
+        parse_policy.cache_clear()
+        parse_policy(value)
+
+    return run
+
+
+def wsgi_request(app, path):
+    """
+    Returns a callable making a GET request straight through the app's WSGI
+    callable, which has less overhead than the test client, and its first response
+    """
+
+    environ = EnvironBuilder(path=path).get_environ()
+    responses = []
+
+    def start_response(status, headers, exc_info=None):  # pylint: disable=unused-argument
+        responses.append((int(status.split()[0]), Headers(headers)))
+
+    def run():
+        for _ in app.wsgi_app(environ.copy(), start_response):
+            pass
+
+    run()
+    return run, responses[0]
+
+
+def request_benchmark(app, path):
+    """Times a GET request through the app"""
+
+    run, (status_code, _) = wsgi_request(app, path)
+    if status_code != 200:
+        raise Skip(f'{path} did not respond with 200')
+
+    return run
+
+
+@benchmark('request.no_csp')
+def bench_request_no_csp():
+    app = Flask('benchmark')
+    app.add_url_rule('/', 'index', lambda: 'Hello')
+    return request_benchmark(app, '/')
+
+
+@benchmark('request.extension')
+def bench_request_extension():
+    app = Flask('benchmark')
+    app.add_url_rule('/', 'index', lambda: 'Hello')
+    CSP(app, **LARGE_POLICY)
+    return request_benchmark(app, '/')
+
+
+@benchmark('request.decorator')
+def bench_request_decorator():
+    app = Flask('benchmark')
+    app.add_url_rule('/', 'index', csp(**LARGE_POLICY)(lambda: 'Hello'))
+    return request_benchmark(app, '/')
+
+
+def error_app():
+    """An app with the extension and views failing in different ways"""
+
+    app = Flask('benchmark')
+    app.config['PROPAGATE_EXCEPTIONS'] = False
+
+    def forbidden():
+        return abort(403)
+
+    def broken():
+        raise RuntimeError('Broken view')
+
+    app.add_url_rule('/forbidden', 'forbidden', forbidden)
+    app.add_url_rule('/broken', 'broken', broken)
+    CSP(app, **LARGE_POLICY)
+
+    # Unhandled exceptions are logged, which would dominate the timing
+    app.logger.disabled = True
+
+    return app
+
+
+def error_benchmark(path, status_code):
+    """Times a failing GET request through the error app"""
+
+    run, (actual_status_code, headers) = wsgi_request(error_app(), path)
+    if actual_status_code != status_code or 'Content-Security-Policy' not in headers:
+        raise Skip(f'{path} did not respond with {status_code} and a CSP header')
+
+    return run
+
+
+@benchmark('request.error.not_found')
+def bench_request_error_not_found():
+    return error_benchmark('/not-found', 404)
+
+
+@benchmark('request.error.http_exception')
+def bench_request_error_http_exception():
+    return error_benchmark('/forbidden', 403)
+
+
+@benchmark('request.error.unhandled_exception')
+def bench_request_error_unhandled_exception():
+    return error_benchmark('/broken', 500)
+
+
+@benchmark('get_submitted_report')
+def bench_get_submitted_report():
+    app = Flask('benchmark')
+    body = json.dumps(CSP_REPORT)
+
+    def run():
+        with app.test_request_context('/report', method='POST', data=body,
+                                      content_type='application/csp-report'):
+            get_submitted_report()
+
+    return run
+
+
+@benchmark('receiver.simple')
+def bench_receiver_simple():
+    app = Flask('benchmark')
+    CSP(app, receiver_prefix='/csp')
+    client = app.test_client()
+    body = json.dumps(CSP_REPORT)
+
+    return lambda: client.post('/report', data=body, content_type='application/csp-report')
+
+
+@benchmark('receiver.sqlalchemy')
+def bench_receiver_sqlalchemy():
+    # pylint: disable=import-outside-toplevel,import-error
+    try:
+        import flask_sqlalchemy
+        import sqlalchemy
+    except ImportError as exc:
+        raise Skip(f'Flask-SQLAlchemy is not installed: {exc}') from exc
+
+    # The models are declared on the app's db, which they read from the sqlalchemy module
+    sqlalchemy.db = flask_sqlalchemy.SQLAlchemy()
+    from flask_csp.sqlalchemy import models, views
+
+    database = os.path.join(tempfile.mkdtemp(), 'reports.db')
+    app = Flask('benchmark')
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{database}'
+    models.db.init_app(app)
+    with app.app_context():
+        models.db.create_all()
+    views.DB = models.db
+
+    # The extension only registers the SQLAlchemy receiver when its models were
+    # importable as flask_csp was imported, before the db was set
+    CSP(app)
+    app.register_blueprint(views.CSP_BP)
+    client = app.test_client()
+    body = json.dumps(CSP_REPORT)
+
+    return lambda: client.post('/report', data=body, content_type='application/csp-report')
+
+
+def measure(func, repeat, min_time):
+    """Returns the best time per call in microseconds, over `repeat` runs"""
+
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    number = max(number, int(number * min_time / 0.2))
+
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return best / number * 1e6, number
+
+
+def run(names, repeat, min_time):
+    """Runs the benchmarks and returns their results"""
+
+    results = {}
+    for name in names:
+        try:
+            func = BENCHMARKS[name]()
+        except Skip as exc:
+            results[name] = {'skipped': str(exc)}
+            continue
+
+        usec, number = measure(func, repeat, min_time)
+        results[name] = {
+            'usec_per_op': round(usec, 3),
+            'ops_per_sec': round(1e6 / usec, 1),
+            'loops': number,
+        }
+
+    return results
+
+
+def check(results, thresholds=None, baseline=None, max_regression=0.2):
+    """Returns the list of failures against absolute thresholds and a baseline run"""
+
+    failures = []
+    for name, result in results.items():
+        if 'usec_per_op' not in result:
+            continue
+
+        limit = (thresholds or {}).get(name)
+        if limit is not None and result['usec_per_op'] > limit:
+            failures.append(f'{name}: {result["usec_per_op"]}us exceeds threshold of {limit}us')
+
+        previous = (baseline or {}).get(name, {}).get('usec_per_op')
+        if previous and result['usec_per_op'] > previous * (1 + max_regression):
+            failures.append(
+                f'{name}: {result["usec_per_op"]}us is more than {max_regression:.0%} '
+                f'slower than the baseline of {previous}us')
+
+    return failures
+
+
+def main(argv=None):
+    """Command line entry point"""
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n', maxsplit=1)[0])
+    parser.add_argument('names', nargs='*', help='Benchmarks to run, defaults to all')
+    parser.add_argument('--output', help='File to write the JSON results to, defaults to stdout')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs')
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='Minimum duration of each timed run in seconds')
+    parser.add_argument('--thresholds', help='JSON file of maximum microseconds per operation')
+    parser.add_argument('--baseline', help='JSON results of a previous run to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help='Allowed slowdown relative to the baseline, i.e. 0.2 for 20%%')
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f'Unknown benchmarks: {", ".join(unknown)}')
+
+    results = run(args.names or list(BENCHMARKS), args.repeat, args.min_time)
+
+    thresholds = baseline = None
+    if args.thresholds:
+        with open(args.thresholds, encoding='utf-8') as thresholds_file:
+            thresholds = json.load(thresholds_file)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)['results']
+
+    failures = check(results, thresholds, baseline, args.max_regression)
+    output = json.dumps({
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+        'failures': failures,
+    }, indent=2, sort_keys=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            output_file.write(output + '\n')
+    else:
+        print(output)
+
+    for failure in failures:
+        print(failure, file=sys.stderr)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
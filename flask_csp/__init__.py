@@ -8,3 +8,5 @@ Content Security Policies (CSP) using a simple decorator.
 
 from .decorator import csp
 from .extension import CSP
+from .middleware import CSPMiddleware
+from .nonce import csp_nonce
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+flask_csp.aggregate
+~~~~
+Coalescing of identical CSP reports before they are stored. Browsers send the
+same violation for every page view, so most reports are repeats.
+"""
+
+import collections
+import logging
+import threading
+from datetime import datetime, timezone
+
+from .periodic import PeriodicThread
+
+
+LOG = logging.getLogger('flask_csp.receiver')
+
+# The report fields, as column names, that identify repeats of a report
+KEY_FIELDS = ('document_uri', 'blocked_uri', 'violated_directive', 'disposition',)
+
+
+def utcnow():
+    """The current time as a naive UTC datetime, as stored by the models"""
+
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class ReportAggregator:
+    """
+    Keeps one row per distinct report, identified by its `key_fields`, with the
+    number of times it was received in `count`, and when it was first and last
+    received in `ts` and `last_seen`. At most `max_entries` rows are kept, the
+    least recently received row being passed to `sink` to make room for a new
+    one. All rows are passed to `sink` every `flush_interval` seconds once
+    started, and when stopped.
+
+        from flask_csp.aggregate import ReportAggregator
+
+        views.AGGREGATOR = ReportAggregator(views.WRITER.submit).start()
+    """
+
+    def __init__(self, sink, *, key_fields=KEY_FIELDS, max_entries=10000, flush_interval=10.0):
+        self.sink = sink
+        self.key_fields = tuple(key_fields)
+        self.max_entries = max_entries
+
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._thread = PeriodicThread(self.flush, flush_interval, name='flask-csp-aggregator',
+                                      on_stop=self.flush)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def add(self, row):
+        """Counts a report, given as a dict of column values"""
+
+        key = tuple(row.get(field) for field in self.key_fields)
+        now = utcnow()
+
+        evicted = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = dict(row, count=0, ts=now)
+                if len(self._entries) > self.max_entries:
+                    _, evicted = self._entries.popitem(last=False)
+
+            else:
+                self._entries.move_to_end(key)
+
+            entry['count'] += 1
+            entry['last_seen'] = now
+
+        if evicted is not None:
+            self.sink(evicted)
+
+    def flush(self):
+        """Passes every row to the sink, returns the number of rows"""
+
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+
+        for entry in entries:
+            self.sink(entry)
+
+        if entries:
+            LOG.debug('Flushed %d aggregated CSP reports', len(entries))
+
+        return len(entries)
+
+    def start(self):
+        """Starts flushing from a background thread, returns the aggregator"""
+
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Stops the background thread and flushes the remaining rows"""
+
+        self._thread.stop(timeout)
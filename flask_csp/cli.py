@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+flask_csp.cli
+~~~~
+The `flask csp` command group, registered on the app by the extension.
+"""
+
+from datetime import timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from .core import resolve_endpoint_policies
+from .hashes import scan_templates
+
+
+CSP_CLI = AppGroup('csp', help='Content Security Policy tools.')
+
+
+@CSP_CLI.command('hashes')
+@click.option('--cache', 'cache_path', default=None,
+              help='Hash cache file, defaults to the `hash_cache` option of the extension.')
+@click.option('--workers', type=int, default=None,
+              help='Number of processes used to hash the templates.')
+def hashes_command(cache_path, workers):
+    """Lists the hash sources of the inline scripts and styles in the templates"""
+
+    extension = current_app.extensions.get('csp')
+    if cache_path is None and extension is not None:
+        cache_path = extension._options.get('hash_cache')  # pylint: disable=protected-access
+
+    for path, hashes in scan_templates(current_app, cache_path=cache_path, workers=workers).items():
+        for directive, sources in hashes.items():
+            for source in sources:
+                click.echo(f'{path}\t{directive.replace("_", "-")}\t{source}')
+
+
+@CSP_CLI.command('endpoints')
+def endpoints_command():
+    """Lists the CSP headers that every endpoint responds with"""
+
+    extension = current_app.extensions.get('csp')
+    default = extension._policy if extension is not None else None  # pylint: disable=protected-access
+
+    endpoints = resolve_endpoint_policies(current_app, default)
+    for endpoint in sorted(current_app.view_functions):
+        if endpoint not in endpoints:
+            click.echo(f'{endpoint}\t-\t-')
+            continue
+
+        source, policy = endpoints[endpoint]
+        for key, value in policy.render('<nonce>'):
+            click.echo(f'{endpoint}\t{source}\t{key}: {value}')
+
+
+@CSP_CLI.command('prune')
+@click.option('--max-age', type=float, default=None,
+              help='Days to keep reports for, defaults to `CSP_REPORT_MAX_AGE`.')
+@click.option('--max-rows', type=int, default=None,
+              help='Number of reports to keep, defaults to `CSP_REPORT_MAX_ROWS`.')
+@click.option('--batch-size', type=int, default=1000,
+              help='Number of reports deleted per transaction.')
+@click.option('--pause', type=float, default=0.0,
+              help='Seconds to wait between transactions.')
+def prune_command(max_age, max_rows, batch_size, pause):
+    """Deletes the old reports and rollups stored by the SQLAlchemy receiver"""
+
+    try:
+        from .sqlalchemy import views  # pylint: disable=import-outside-toplevel
+        from .sqlalchemy.retention import (  # pylint: disable=import-outside-toplevel
+            get_retention, prune_reports, prune_rollups,
+        )
+    except ImportError as exc:
+        raise click.ClickException(f'The SQLAlchemy backend is not available: {exc}') from exc
+
+    if views.DB is None:
+        raise click.ClickException('flask_csp.sqlalchemy.views.DB is not set')
+
+    retention = get_retention(current_app)
+    if max_age is not None:
+        retention['max_age'] = timedelta(days=max_age)
+    if max_rows is not None:
+        retention['max_rows'] = max_rows
+
+    if retention['max_age'] is None and retention['max_rows'] is None:
+        raise click.UsageError('No retention set, use --max-age and/or --max-rows')
+
+    reports = prune_reports(views.DB, batch_size=batch_size, pause=pause, **retention)
+    rollups = prune_rollups(views.DB, max_age=retention['max_age'], batch_size=batch_size,
+                            pause=pause)
+    click.echo(f'Deleted {reports} reports and {rollups} rollups')
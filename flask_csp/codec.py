@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+flask_csp.codec
+~~~~
+JSON codecs used by the report receivers. `orjson` is used when it is
+installed, the standard library's `json` module otherwise.
+"""
+
+import json
+
+try:
+    import orjson
+    ORJSON = True
+except ImportError:
+    ORJSON = False
+
+
+class JSONCodec:
+    """
+    Codec based on the standard library. Codecs decode request bodies, given as
+    bytes, and encode objects into compact strings for the logs.
+    """
+
+    name = 'json'
+
+    def loads(self, data):
+        """Returns the object of a JSON document, raising a ValueError when invalid"""
+
+        return json.loads(data)
+
+    def loads_array(self, data):
+        """Returns the items of a JSON array, raising a ValueError for anything else"""
+
+        items = self.loads(data)
+        if not isinstance(items, list):
+            raise ValueError('Not a JSON array')
+
+        return items
+
+    def dumps(self, obj):
+        """Returns the compact JSON string of an object, with sorted keys"""
+
+        return json.dumps(obj, separators=(',', ':'), sort_keys=True)
+
+
+class OrjsonCodec(JSONCodec):
+    """Codec based on `orjson`, whose errors are ValueErrors as well"""
+
+    # pylint cannot inspect the members of the orjson extension module
+    # pylint: disable=no-member
+
+    name = 'orjson'
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+    def dumps(self, obj):
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS).decode('utf-8')
+
+
+def get_default_codec():
+    """Returns the fastest available codec"""
+
+    return OrjsonCodec() if ORJSON else JSONCodec()
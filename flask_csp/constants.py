@@ -118,6 +118,30 @@ class SandboxRestriction(Enum):
 # to a view.
 FLASK_CSP_EVALUATED = '_FLASK_CSP_EVALUATED'
 
+# Attribute added to decorated views and initialized blueprints, holding the
+# policy that they apply, so the policy of an endpoint can be resolved ahead of time
+FLASK_CSP_POLICY = '_FLASK_CSP_POLICY'
+
+# Options which configure Flask-CSP itself rather than a directive of the policy
+NON_DIRECTIVE_OPTIONS = (
+    'endpoint_table',
+    'hash_cache',
+    'hash_inline',
+    'header_budget',
+    'intercept_exceptions',
+    'metrics',
+    'minify',
+    'nonce',
+    'report_only',
+    'reporting_headers',
+    'split_nonce_header',
+)
+
+# The `reporting_headers` option selects which of these headers are sent for the
+# `report_to` option, defaulting to the legacy `Report-To` header. Both can be sent.
+REPORT_TO_HEADER = 'Report-To'
+REPORTING_ENDPOINTS_HEADER = 'Reporting-Endpoints'
+
 DEFAULT_OPTIONS = {item.name.lower(): None for item in Directive}
 DEFAULT_OPTIONS.update({
     'default_src': FetchRestriction.SELF,
@@ -6,16 +6,32 @@ Core functionality shared between the extension and the decorator.
 """
 
 import logging
+import time
+import weakref
 
-from flask import current_app
+from flask import current_app, has_request_context, request
 from werkzeug.datastructures import Headers, MultiDict
 
-from .constants import Directive, FLASK_CSP_EVALUATED, DEFAULT_OPTIONS
-from .policy import ReportGroup, ReportTo, ContentSecurityPolicy, ReportOnlyPolicy, load_directive
+from .constants import (
+    Directive, FetchRestriction, FLASK_CSP_EVALUATED, FLASK_CSP_POLICY, DEFAULT_OPTIONS,
+    NON_DIRECTIVE_OPTIONS, REPORT_TO_HEADER,
+)
+from .metrics import METRICS, HEADER_BUILD_SECONDS, HEADER_BYTES
+from .nonce import NONCE_DIRECTIVES, NONCE_SLOT, NONCE_SOURCE, csp_nonce
+from .policy import (
+    ReportGroup, ReportTo, ReportingEndpoints, ContentSecurityPolicy, ReportOnlyPolicy,
+    FETCH_FALLBACKS, SourceDirective, is_allowed_directive, load_directive, render_token,
+)
 
 
 LOG = logging.getLogger(__name__)
 
+# The directive types that fetches are checked against, directly or through a fallback
+FETCH_DIRECTIVES = (Directive.DEFAULT_SRC,) + tuple(FETCH_FALLBACKS)
+
+# The app configuration keys that are read by `get_app_kwarg_dict`
+CONFIG_KEYS = tuple(f'CSP_{item.name.upper()}' for item in Directive)
+
 
 def set_csp_header(resp, options):
     """
@@ -26,6 +42,20 @@ def set_csp_header(resp, options):
     callback
     """
 
+    # If CSP has already been evaluated via the decorator, skip
+    if hasattr(resp, FLASK_CSP_EVALUATED):
+        LOG.debug('CSP has been already evaluated, skipping')
+        return resp
+
+    return apply_csp_headers(resp, build_csp_headers(options))
+
+
+def apply_csp_headers(resp, headers):
+    """
+    Adds already rendered `(key, value)` header pairs to the response object,
+    unless CSP has already been evaluated for it.
+    """
+
     # If CSP has already been evaluated via the decorator, skip
     if hasattr(resp, FLASK_CSP_EVALUATED):
         LOG.debug('CSP has been already evaluated, skipping')
@@ -40,33 +70,322 @@ def set_csp_header(resp, options):
            and not isinstance(resp.headers, MultiDict)):
         resp.headers = MultiDict(resp.headers)
 
-    non_directive_options = ['report_only',]
+    for key, value in headers:
+        resp.headers.add(key, value)
+
+    if METRICS.enabled:
+        HEADER_BYTES.observe(
+            sum(len(key) + len(value) + 4 for key, value in headers),
+            request.endpoint if has_request_context() else None,
+        )
+
+    return resp
+
+
+def build_csp_headers(options):
+    """
+    Renders the Flask-CSP options into a tuple of `(key, value)` header pairs
+    """
+
+    start = time.perf_counter()
+    options = add_nonce_sources(options)
+
     header = (ReportOnlyPolicy if options.get('report_only', False) else ContentSecurityPolicy)()
     for option, restrictions in options.items():
-        if option in non_directive_options or not restrictions:
+        if option in NON_DIRECTIVE_OPTIONS or not restrictions:
             continue
         if not isinstance(restrictions, (list, set, tuple, )):
             restrictions = [restrictions]
+        if option == 'report_to':
+            # The directive only names the group that reports are sent to
+            restrictions = [get_report_groups(options)[0].name]
         header.add(load_directive(option, *restrictions))
 
-    LOG.debug('Settings CSP header: %s', header.value)
-    resp.headers.add(header.key, header.value)
+    if options.get('minify'):
+        size = len(header.value)
+        header = header.minify()
+        LOG.info('Minified the %s header from %d to %d bytes',
+                 header.key, size, len(header.value))
 
-    if options.get('report_to'):
-        report_to = ReportTo()
-        report_groups = options['report_to']
-        if not isinstance(report_groups, (list, set, tuple,)):
-            report_groups = [report_groups]
-        for group in report_groups:
-            report_to.add(
-                ReportGroup(group['name'],
-                            group['endpoints'],
-                            max_age=group.get('max_age', None))
-            )
+    policies = [header]
+    if options.get('nonce') and options.get('split_nonce_header'):
+        policies = split_nonce_policy(header)
 
-        resp.headers.add(report_to.key, report_to.value)
+    headers = []
+    for policy in policies:
+        LOG.debug('Settings CSP header: %s', policy.value)
+        headers.append((policy.key, policy.value))
+    headers.extend(build_reporting_headers(options))
 
-    return resp
+    if METRICS.enabled:
+        HEADER_BUILD_SECONDS.observe(time.perf_counter() - start)
+
+    return tuple(headers)
+
+
+def relax_nonce_directive(directive):
+    """
+    Returns a version of a directive with the nonce source that allows at least
+    everything the directive allows for any nonce, and is the same for every
+    request: inline content is allowed instead of the nonce.
+    """
+
+    tokens = [render_token(restriction) for restriction in directive.restrictions]
+
+    # Hashes and 'strict-dynamic' would disable 'unsafe-inline'
+    sources = [
+        token for token in tokens
+        if token not in (NONCE_SOURCE, FetchRestriction.STRICT_DYNAMIC.value)
+        and not token.startswith(("'sha256-", "'sha384-", "'sha512-"))
+    ]
+
+    # 'strict-dynamic' trusts scripts loaded by trusted scripts from anywhere
+    if FetchRestriction.STRICT_DYNAMIC.value in tokens:
+        sources = ['*', FetchRestriction.DATA.value, 'blob:'] + [
+            source for source in sources if source.startswith("'")
+        ]
+
+    if FetchRestriction.UNSAFE_INLINE.value not in sources:
+        sources.append(FetchRestriction.UNSAFE_INLINE.value)
+
+    return SourceDirective(directive.directive, *sources)
+
+
+def get_effective_directive(directives, directive):
+    """
+    Returns the directive of a `{Directive: directive}` dict that the browser
+    checks a fetch of the given type against, following the fetch fallbacks
+    """
+
+    for item in (directive,) + FETCH_FALLBACKS.get(directive, ()):
+        if item in directives:
+            return directives[item]
+
+    return None
+
+
+def split_nonce_policy(header):
+    """
+    Splits a policy with nonce sources into two policies of the same type: a
+    static one, which is identical for every request, and a minimal one with
+    only the directives that have the nonce source, the directives that fetches
+    would otherwise fall back to those for, and the reporting directives.
+
+    Browsers enforce both policies. The static policy allows inline content in
+    place of the nonce, and every fetch is checked against the same directive
+    of the original policy in at least one of the two, so together they allow
+    what the original policy allows. HTTP/2 and HTTP/3 header compression can
+    index the large static header.
+    """
+
+    directives = {}
+    for directive in header.directives:
+        directives.setdefault(directive.directive, directive)
+
+    nonce_directives = {
+        key: directive for key, directive in directives.items()
+        if NONCE_SOURCE in [render_token(restriction) for restriction in directive.restrictions]
+    }
+
+    # A fetch whose directive is missing from the per-request policy falls back
+    # to another one, which may be a nonce directive that blocks it. The missing
+    # directives are added until every fetch is checked against either the same
+    # directive as in the original policy, or none.
+    per_request = dict(nonce_directives)
+    changed = True
+    while changed:
+        changed = False
+        for fetch in FETCH_DIRECTIVES:
+            effective = get_effective_directive(per_request, fetch)
+            if effective is None:
+                continue
+
+            original = get_effective_directive(directives, fetch)
+            if effective is not original:
+                per_request[original.directive] = original
+                changed = True
+
+    static_policy = type(header)()
+    per_request_policy = type(header)()
+    for directive in header.directives:
+        if directive.directive in nonce_directives:
+            static_policy.add(relax_nonce_directive(directive))
+        else:
+            static_policy.add(directive)
+
+        if (per_request.get(directive.directive) is directive
+                or directive.directive in (Directive.REPORT_TO, Directive.REPORT_URI)):
+            per_request_policy.add(directive)
+
+    return [static_policy, per_request_policy]
+
+
+def get_report_groups(options):
+    """
+    Returns the report groups of the `report_to` option, which can be group
+    names or dicts with the `name`, `endpoints` and optional `max_age` keys
+    """
+
+    report_groups = options.get('report_to') or []
+    if not isinstance(report_groups, (list, set, tuple,)):
+        report_groups = [report_groups]
+
+    groups = []
+    for group in report_groups:
+        if isinstance(group, ReportGroup):
+            groups.append(group)
+        elif isinstance(group, dict):
+            groups.append(ReportGroup(group['name'],
+                                      group['endpoints'],
+                                      max_age=group.get('max_age', None)))
+        else:
+            groups.append(ReportGroup(str(group), None))
+
+    return groups
+
+
+def build_reporting_headers(options):
+    """
+    Renders the `Report-To` and/or `Reporting-Endpoints` headers for the report
+    groups with endpoints in the `report_to` option, as selected by the
+    `reporting_headers` option.
+    """
+
+    groups = [group for group in get_report_groups(options) if group.endpoints]
+    if not groups:
+        return []
+
+    selected = options.get('reporting_headers') or REPORT_TO_HEADER
+    if not isinstance(selected, (list, set, tuple,)):
+        selected = [selected]
+
+    headers = []
+    for header_class in (ReportTo, ReportingEndpoints):
+        if header_class.key.lower() in (str(item).lower() for item in selected):
+            header = header_class(groups)
+            headers.append((header.key, header.value))
+
+    if not headers:
+        raise ValueError(f'Not a valid reporting header: {selected}')
+
+    return headers
+
+
+def add_sources(options, directive, *sources):
+    """
+    Adds sources to a directive of the options, in place. A directive which is
+    not set gets the `default_src` restrictions it would otherwise fall back to.
+    """
+
+    name = is_allowed_directive(directive).name.lower()
+
+    restrictions = options.get(name) or options.get('default_src') or []
+    if not isinstance(restrictions, (list, set, tuple, )):
+        restrictions = [restrictions]
+
+    # 'none' cannot be combined with other sources
+    restrictions = [
+        restriction for restriction in restrictions
+        if restriction not in (FetchRestriction.NONE, FetchRestriction.NONE.value)
+    ]
+    for source in sources:
+        if source not in restrictions:
+            restrictions.append(source)
+
+    options[name] = restrictions
+
+
+def add_nonce_sources(options):
+    """
+    Returns a copy of the options with the nonce placeholder added to the
+    directives listed in the `nonce` option.
+    """
+
+    directives = options.get('nonce')
+    if not directives:
+        return options
+
+    if directives is True:
+        directives = NONCE_DIRECTIVES
+    elif not isinstance(directives, (list, set, tuple, )):
+        directives = [directives]
+
+    options = options.copy()
+    for directive in directives:
+        add_sources(options, directive, NONCE_SOURCE)
+
+    return options
+
+
+def is_dynamic(options):
+    """
+    Returns whether any of the restrictions in the options is a callable, which
+    must be evaluated every time the header is rendered.
+    """
+
+    for option, restrictions in options.items():
+        if option in NON_DIRECTIVE_OPTIONS or not restrictions:
+            continue
+        if not isinstance(restrictions, (list, set, tuple, )):
+            restrictions = [restrictions]
+        if any(callable(restriction) for restriction in restrictions):
+            return True
+
+    return False
+
+
+class CompiledPolicy:
+    """
+    The headers for a set of Flask-CSP options, rendered once so that applying
+    them to a response is only a matter of appending them.
+
+    When the `nonce` option is set, only the nonce placeholder is filled in for
+    every response. Options containing callable restrictions cannot be rendered
+    ahead of time, so those are still rendered for every response.
+    """
+
+    options = None
+    dynamic = False
+    nonce = False
+
+    def __init__(self, options):
+        self.options = options
+        self.dynamic = is_dynamic(options)
+        self.nonce = bool(options.get('nonce'))
+        self._headers = None if self.dynamic else build_csp_headers(options)
+
+        budget = options.get('header_budget')
+        for key, value in (self._headers or ()):
+            if budget and len(key) + len(value) + 4 > budget:
+                LOG.warning('The %s header is %d bytes, exceeding the budget of %d bytes',
+                            key, len(key) + len(value) + 4, budget)
+
+    @property
+    def headers(self):
+        """The `(key, value)` header pairs for this policy and the current request"""
+
+        return self.render(csp_nonce() if self.nonce else None)
+
+    def render(self, nonce=None):
+        """Returns the `(key, value)` header pairs, using the provided nonce"""
+
+        headers = self._headers
+        if headers is None:
+            headers = build_csp_headers(self.options)
+
+        if not self.nonce:
+            return headers
+
+        return tuple((key, value.replace(NONCE_SLOT, nonce)) for key, value in headers)
+
+    def apply(self, resp):
+        """Adds the policy headers to the response object"""
+
+        if hasattr(resp, FLASK_CSP_EVALUATED):
+            LOG.debug('CSP has been already evaluated, skipping')
+            return resp
+
+        return apply_csp_headers(resp, self.headers)
 
 
 def get_csp_options(app, *dicts):
@@ -98,3 +417,101 @@ def get_app_kwarg_dict(app=None):
         for k in Directive
         if app_config.get(f'CSP_{k.name.upper()}') is not None
     }
+
+
+def get_config_version(app=None):
+    """
+    Returns a snapshot of the app's CSP specific configuration values, which
+    changes whenever any of the `CSP_*` keys is set to a different value.
+    """
+
+    app = (app or current_app)
+    app_config = getattr(app, 'config', {})
+
+    return tuple(map(app_config.get, CONFIG_KEYS))
+
+
+class PolicyCache:
+    """
+    Caches the compiled policy of a set of options for each app, so that the
+    options only have to be merged with the app's configuration again when its
+    `CSP_*` configuration changes.
+    """
+
+    options = None
+
+    def __init__(self, options):
+        self.options = options
+        self._policies = weakref.WeakKeyDictionary()
+
+    def get(self, app):
+        """Returns the compiled policy for the app"""
+
+        # Proxies such as `current_app` cannot be weakly referenced
+        if hasattr(app, '_get_current_object'):
+            app = app._get_current_object()  # pylint: disable=protected-access
+
+        version = get_config_version(app)
+        cached = self._policies.get(app)
+        if cached is None or cached[0] != version:
+            cached = (version, CompiledPolicy(get_csp_options(app, self.options)))
+            self._policies[app] = cached
+
+            if cached[1].nonce:
+                app.jinja_env.globals.setdefault('csp_nonce', csp_nonce)
+
+        return cached[1]
+
+    def invalidate(self, app=None):
+        """Drops the cached policy of the app, or of all apps"""
+
+        if app is None:
+            self._policies.clear()
+        else:
+            self._policies.pop(app, None)
+
+
+def is_table_policy(app, policy):
+    """
+    Returns whether the endpoint table of the app's extension applies the
+    policy to the current request, in which case the decorator and the
+    blueprint handlers leave the headers to it
+    """
+
+    endpoints = getattr(app.extensions.get('csp'), '_endpoints', None)
+    return endpoints is not None and endpoints.get(request.endpoint) is policy
+
+
+def resolve_endpoint_policies(app, default=None):
+    """
+    Returns a dict mapping every endpoint of the app to a `(source, policy)`
+    tuple, describing the compiled policy that applies to the endpoint's
+    responses and where it comes from, in order of precedence:
+
+    - `decorator`, for views wrapped with the decorator
+    - `blueprint:<name>`, for views of a blueprint initialized with the
+      extension, the innermost one winning
+    - `app`, for any other view, if a default policy is provided
+    """
+
+    endpoints = {}
+    for endpoint, view in app.view_functions.items():
+        policies = getattr(view, FLASK_CSP_POLICY, None)
+        if policies is not None:
+            endpoints[endpoint] = ('decorator', policies.get(app))
+            continue
+
+        # The innermost blueprint's handler runs first, so its policy wins
+        name = endpoint.rpartition('.')[0]
+        while name:
+            policy = getattr(app.blueprints.get(name), FLASK_CSP_POLICY, None)
+            if policy is not None:
+                endpoints[endpoint] = (f'blueprint:{name}', policy)
+                break
+            name = name.rpartition('.')[0]
+
+        else:
+            if default is not None:
+                endpoints[endpoint] = ('app', default)
+
+    return endpoints
@@ -6,11 +6,13 @@ A decorator to protect a single Flask route with CSP
 """
 
 import functools
+import inspect
 import logging
 
 from flask import make_response, current_app
 
-from .core import get_csp_options, set_csp_header
+from .constants import FLASK_CSP_POLICY
+from .core import PolicyCache, is_table_policy
 
 
 LOG = logging.getLogger(__name__)
@@ -26,14 +28,40 @@ def csp(*args, **kwargs):
     def wrapper(f):  # pylint: disable=invalid-name
         LOG.debug("Enabling %s for csp using options: %s", f, _options)
 
-        @functools.wraps(f)
-        def decorated(*args, **kwargs):
-            # Handle setting of Flask-CSP parameters
-            options = get_csp_options(current_app, _options)
+        # The options are only merged with the app's configuration when it changes
+        policies = PolicyCache(_options)
 
-            resp = make_response(f(*args, **kwargs))
+        if inspect.iscoroutinefunction(f):
+            @functools.wraps(f)
+            async def decorated(*args, **kwargs):
+                # Handle setting of Flask-CSP parameters
+                app = current_app._get_current_object()  # pylint: disable=protected-access
+                policy = policies.get(app)
 
-            return set_csp_header(resp, options)
+                resp = make_response(await f(*args, **kwargs))
+
+                # The app's endpoint table applies this policy instead
+                if is_table_policy(app, policy):
+                    return resp
+
+                return policy.apply(resp)
+
+        else:
+            @functools.wraps(f)
+            def decorated(*args, **kwargs):
+                # Handle setting of Flask-CSP parameters
+                app = current_app._get_current_object()  # pylint: disable=protected-access
+                policy = policies.get(app)
+
+                resp = make_response(f(*args, **kwargs))
+
+                # The app's endpoint table applies this policy instead
+                if is_table_policy(app, policy):
+                    return resp
+
+                return policy.apply(resp)
+
+        setattr(decorated, FLASK_CSP_POLICY, policies)
 
         return decorated
 
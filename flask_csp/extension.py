@@ -4,9 +4,16 @@ flask_csp.extension
 
 import logging
 
-from flask import Flask, Blueprint
+from flask import Flask, Blueprint, current_app, request
 
-from .core import get_csp_options, set_csp_header
+from .cli import CSP_CLI
+from .constants import FLASK_CSP_POLICY
+from .core import (
+    add_sources, get_csp_options, is_table_policy, resolve_endpoint_policies, CompiledPolicy,
+)
+from .hashes import collect_inline_hashes
+from .metrics import METRICS
+from .nonce import csp_nonce
 
 from .simple.views import CSP_BP as simple_bp
 
@@ -34,6 +41,8 @@ class CSP:
     """
 
     _options = {}
+    _policy = None
+    _endpoints = None
     _receiver_prefix = None
     _sqlalchemy = False
 
@@ -57,24 +66,19 @@ class CSP:
             raise ValueError('Provided value was not a Flask app instance')
 
         self.setup_after_request(app, **kwargs)
+        app.add_template_global(csp_nonce)
+        app.cli.add_command(CSP_CLI)
+        app.extensions['csp'] = self
 
         if receiver_prefix is not None:
             self._receiver_prefix = receiver_prefix
         if sqlalchemy is not None:
             self._sqlalchemy = sqlalchemy
 
-        # These error handlers will still respect the behavior of the route
-        if self._options.get('intercept_exceptions', True):
-            def _after_request_decorator(f):  # pylint: disable=invalid-name
-                def wrapped_function(*args, **kwargs):
-                    return self.after_request(app.make_response(f(*args, **kwargs)))
-                return wrapped_function
-
-            if hasattr(app, 'handle_exception'):
-                app.handle_exception = _after_request_decorator(
-                    app.handle_exception)
-                app.handle_user_exception = _after_request_decorator(
-                    app.handle_user_exception)
+        # Error responses, including those of unhandled exceptions, are finalized
+        # through the after request handlers as well, so they get the compiled
+        # headers without wrapping the app's exception handling. The
+        # `intercept_exceptions` option is accepted for backwards compatibility.
 
         if self._receiver_prefix is None:
             LOG.info(
@@ -98,6 +102,8 @@ class CSP:
             raise ValueError('Provided value was not a Blueprint instance')
 
         self.setup_after_request(blueprint, **kwargs)
+        blueprint.add_app_template_global(csp_nonce)
+        setattr(blueprint, FLASK_CSP_POLICY, self._policy)
 
     def setup_after_request(self, app_or_bp, **kwargs):
         """Adds the CSP header handler to the after request flow"""
@@ -106,9 +112,53 @@ class CSP:
         # or the kwargs to the call to init_app/init_blueprint.
         self._options = get_csp_options(app_or_bp, self._options, kwargs)
 
+        # Allow the static inline scripts and styles of the templates by their hashes
+        if self._options.get('hash_inline'):
+            hashes = collect_inline_hashes(app_or_bp, cache_path=self._options.get('hash_cache'))
+            for directive, sources in hashes.items():
+                if sources:
+                    add_sources(self._options, directive, *sources)
+
+        if self._options.get('metrics'):
+            METRICS.enable()
+
+        # The options do not change after this point, so the headers are rendered
+        # once here rather than for every response
+        self._policy = CompiledPolicy(self._options)
+
         app_or_bp.after_request(self.after_request)
 
+    def warm_up(self, app):
+        """
+        Resolves the policy of every endpoint of the app into the endpoint table,
+        which is used by the after request handler when the `endpoint_table`
+        option is set. This happens on the first response otherwise, and must be
+        repeated when views or the `CSP_*` configuration change afterwards.
+
+        The table follows the precedence of the handlers it replaces: the
+        decorator, then the innermost blueprint initialized with the extension,
+        then the app. Those handlers leave the headers to the table of the app's
+        extension when it holds their policy for the endpoint, and apply it
+        themselves otherwise, e.g. when a wrapper hides the decorator.
+        """
+
+        self._endpoints = {
+            endpoint: policy
+            for endpoint, (_, policy) in resolve_endpoint_policies(app, self._policy).items()
+        }
+
     def after_request(self, resp):
         """After request handler that adds the CSP header"""
 
-        return set_csp_header(resp, self._options)
+        # A blueprint's handler leaves the headers to the app's endpoint table
+        if (current_app.extensions.get('csp') is not self
+                and is_table_policy(current_app, self._policy)):
+            return resp
+
+        if self._endpoints is None:
+            if not self._options.get('endpoint_table'):
+                return self._policy.apply(resp)
+
+            self.warm_up(current_app)
+
+        return self._endpoints.get(request.endpoint, self._policy).apply(resp)
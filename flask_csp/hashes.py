@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+flask_csp.hashes
+~~~~
+Hash sources for the static inline scripts and styles found in an app's
+templates, allowing them without `'unsafe-inline'`.
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import Flask
+
+
+LOG = logging.getLogger(__name__)
+
+INLINE_BLOCK = re.compile(r'<(script|style)\b([^>]*)>(.*?)</\1\s*>', re.IGNORECASE | re.DOTALL)
+SRC_ATTRIBUTE = re.compile(r'\bsrc\s*=', re.IGNORECASE)
+
+# Blocks containing any of these are rendered differently for each request
+JINJA_MARKERS = ('{{', '{%', '{#')
+
+TEMPLATE_EXTENSIONS = ('.html', '.htm', '.j2', '.jinja', '.jinja2', '.svg', '.xml',)
+
+# Below this many templates to hash, a process pool costs more than it saves
+POOL_THRESHOLD = 64
+
+
+def hash_source(content, algorithm='sha256'):
+    """Returns the CSP hash source for the content of an inline block"""
+
+    digest = hashlib.new(algorithm, content.encode('utf-8')).digest()
+    return f"'{algorithm}-{base64.b64encode(digest).decode('ascii')}'"
+
+
+def extract_inline_hashes(source):
+    """
+    Returns the hash sources of the static inline `<script>` and `<style>`
+    blocks of a template's source as a `{'script_src': [], 'style_src': []}` dict
+    """
+
+    hashes = {'script_src': [], 'style_src': []}
+    for match in INLINE_BLOCK.finditer(source):
+        tag, attributes, content = match.groups()
+        if not content.strip() or any(marker in content for marker in JINJA_MARKERS):
+            continue
+
+        if tag.lower() == 'script':
+            if SRC_ATTRIBUTE.search(attributes):
+                continue
+            hashes['script_src'].append(hash_source(content))
+
+        else:
+            hashes['style_src'].append(hash_source(content))
+
+    return hashes
+
+
+def hash_template(path):
+    """Returns the hash sources of the template at the path"""
+
+    with open(path, encoding='utf-8') as template:
+        return extract_inline_hashes(template.read())
+
+
+def iter_template_paths(app_or_bp, extensions=TEMPLATE_EXTENSIONS):
+    """
+    Yields the paths of the templates of an app and its registered blueprints,
+    or of a single blueprint
+    """
+
+    scaffolds = [app_or_bp]
+    if isinstance(app_or_bp, Flask):
+        scaffolds.extend(app_or_bp.iter_blueprints())
+
+    for scaffold in scaffolds:
+        loader = scaffold.jinja_loader
+        if loader is None:
+            continue
+
+        for searchpath in getattr(loader, 'searchpath', []):
+            for root, _, filenames in os.walk(searchpath):
+                for filename in sorted(filenames):
+                    if filename.lower().endswith(extensions):
+                        yield os.path.join(root, filename)
+
+
+def load_cache(cache_path):
+    """Returns the hash cache stored at the path, or an empty one"""
+
+    if not cache_path:
+        return {}
+
+    try:
+        with open(cache_path, encoding='utf-8') as cache:
+            return json.load(cache)
+
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(cache_path, cache):
+    """Stores the hash cache at the path"""
+
+    tmp_path = f'{cache_path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as tmp:
+        json.dump(cache, tmp, sort_keys=True)
+    os.replace(tmp_path, cache_path)
+
+
+def scan_templates(app_or_bp, cache_path=None, workers=None):
+    """
+    Returns the hash sources of every template as a `{path: hashes}` dict.
+
+    Results are cached on disk at `cache_path`, keyed by the template's path and
+    modification time, so that only new or changed templates are hashed. Those
+    are hashed in a pool of `workers` processes when there are many of them.
+    """
+
+    cache = load_cache(cache_path)
+
+    template_paths = list(iter_template_paths(app_or_bp))
+
+    results = {}
+    pending = {}
+    for path in template_paths:
+        mtime = os.stat(path).st_mtime
+        cached = cache.get(path)
+        if cached and cached['mtime'] == mtime:
+            results[path] = cached['hashes']
+        else:
+            pending[path] = mtime
+
+    if pending:
+        LOG.debug('Hashing inline blocks of %d templates', len(pending))
+
+        paths = list(pending)
+        if workers == 1 or (workers is None and len(paths) < POOL_THRESHOLD):
+            hashes = map(hash_template, paths)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                hashes = list(pool.map(hash_template, paths, chunksize=16))
+
+        for path, template_hashes in zip(paths, hashes):
+            results[path] = template_hashes
+
+    if cache_path and (pending or len(cache) != len(results)):
+        save_cache(cache_path, {
+            path: {
+                'mtime': pending[path] if path in pending else cache[path]['mtime'],
+                'hashes': hashes,
+            }
+            for path, hashes in results.items()
+        })
+
+    return {path: results[path] for path in template_paths}
+
+
+def collect_inline_hashes(app_or_bp, cache_path=None, workers=None):
+    """
+    Returns the hash sources of all templates as a
+    `{'script_src': [], 'style_src': []}` dict, without duplicates
+    """
+
+    collected = {'script_src': {}, 'style_src': {}}
+    for hashes in scan_templates(app_or_bp, cache_path=cache_path, workers=workers).values():
+        for directive, sources in hashes.items():
+            collected[directive].update(dict.fromkeys(sources))
+
+    return {directive: list(sources) for directive, sources in collected.items()}
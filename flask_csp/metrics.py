@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+flask_csp.metrics
+~~~~
+Counters and histograms of the time and bytes CSP adds to responses, and of
+the reports received. Metrics are disabled by default. Once enabled, through
+`METRICS.enable()` or the `metrics` option of the extension, they can be read
+with `METRICS.snapshot()`, or scraped from the receiver's `/metrics` route in
+the Prometheus text format once `CSP_METRICS_ROUTE` is set.
+"""
+
+import bisect
+import threading
+
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+TIME_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+                0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+SIZE_BUCKETS = (128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+
+def format_labels(names, values, extra=None):
+    """Returns the Prometheus label string of the label values, with an extra `(name, value)`"""
+
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+
+    escaped = [
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    ]
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+class Metric:
+    """Base class of the metrics, which are kept per combination of label values"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def clear(self):
+        """Forgets the values of every combination of labels"""
+
+        with self._lock:
+            self._values.clear()
+
+    def samples(self):
+        """Returns the `(suffix, label string, value)` samples of the metric"""
+
+        raise NotImplementedError()
+
+    def render(self):
+        """Returns the metric in the Prometheus text format"""
+
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.kind}',
+        ]
+        for suffix, labels, value in self.samples():
+            lines.append(f'{self.name}{suffix}{labels} {value}')
+
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """A count that only goes up"""
+
+    kind = 'counter'
+
+    def inc(self, *label_values, amount=1):
+        """Adds `amount` to the count of the label values"""
+
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def snapshot(self):
+        """Returns the counts, keyed by label values"""
+
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self):
+        return [
+            ('', format_labels(self.labels, label_values), value)
+            for label_values, value in sorted(self.snapshot().items())
+        ]
+
+
+class Histogram(Metric):
+    """The distribution of observed values, counted in cumulative buckets"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=TIME_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *label_values):
+        """Counts a value in its bucket and sum, for the label values"""
+
+        with self._lock:
+            counts = self._values.get(label_values)
+            if counts is None:
+                # One count per bucket, the +Inf bucket, then the sum
+                counts = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    def snapshot(self):
+        """Returns the count, sum and per bucket counts, keyed by label values"""
+
+        with self._lock:
+            values = {label_values: list(counts) for label_values, counts in self._values.items()}
+
+        return {
+            label_values: {
+                'count': sum(counts[:-1]),
+                'sum': counts[-1],
+                'buckets': dict(zip(self.buckets + (float('inf'),), counts[:-1])),
+            }
+            for label_values, counts in values.items()
+        }
+
+    def samples(self):
+        samples = []
+        for label_values, values in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, count in values['buckets'].items():
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                samples.append(('_bucket', format_labels(self.labels, label_values, ('le', le)),
+                                cumulative))
+            samples.append(('_sum', format_labels(self.labels, label_values), values['sum']))
+            samples.append(('_count', format_labels(self.labels, label_values), values['count']))
+
+        return samples
+
+
+class Registry:
+    """The collection of Flask-CSP metrics"""
+
+    enabled = False
+
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        """Adds a metric to the registry, returns the metric"""
+
+        self.metrics[metric.name] = metric
+        return metric
+
+    def enable(self, enabled=True):
+        """Turns the recording of the metrics on, or off"""
+
+        self.enabled = enabled
+
+    def clear(self):
+        """Forgets the values of all metrics"""
+
+        for metric in self.metrics.values():
+            metric.clear()
+
+    def snapshot(self):
+        """Returns the current values of all metrics, keyed by metric name and label values"""
+
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def render(self):
+        """Returns all metrics in the Prometheus text format"""
+
+        return '\n'.join(metric.render() for metric in self.metrics.values()) + '\n'
+
+
+METRICS = Registry()
+
+HEADER_BUILD_SECONDS = METRICS.register(Histogram(
+    'flask_csp_header_build_seconds',
+    'Time spent rendering CSP options into headers.'))
+HEADER_BYTES = METRICS.register(Histogram(
+    'flask_csp_header_bytes',
+    'Size of the CSP headers added to responses.',
+    labels=('endpoint',), buckets=SIZE_BUCKETS))
+REPORTS_RECEIVED = METRICS.register(Counter(
+    'flask_csp_reports_received_total',
+    'CSP reports accepted by the receiver.',
+    labels=('backend',)))
+REPORTS_REJECTED = METRICS.register(Counter(
+    'flask_csp_reports_rejected_total',
+    'CSP reports rejected by the receiver.',
+    labels=('status',)))
+REPORTS_DROPPED = METRICS.register(Counter(
+    'flask_csp_reports_dropped_total',
+    'CSP reports accepted by the receiver but never stored.'))
+REPORT_PARSE_SECONDS = METRICS.register(Histogram(
+    'flask_csp_report_parse_seconds',
+    'Time spent parsing submitted CSP reports.'))
+REPORT_WRITE_SECONDS = METRICS.register(Histogram(
+    'flask_csp_report_write_seconds',
+    'Time spent writing CSP reports to the database.'))
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+flask_csp.middleware
+~~~~
+WSGI middleware adding the CSP headers to every response of an app, without
+going through the after request handlers.
+"""
+
+from flask import has_request_context, request
+
+from .core import add_sources, get_csp_options, CompiledPolicy
+from .hashes import collect_inline_hashes
+from .metrics import METRICS, HEADER_BYTES
+from .nonce import NONCE_ENVIRON_KEY, NONCES, csp_nonce
+
+
+# Key of the WSGI environ under which a request can override the middleware's
+# policy, with a CompiledPolicy, a tuple of `(key, value)` header pairs, or
+# `False` to send no CSP headers
+POLICY_ENVIRON_KEY = 'flask_csp.policy'
+
+CSP_HEADER_KEYS = frozenset([
+    'content-security-policy',
+    'content-security-policy-report-only',
+])
+
+# Options of the extension that rely on its after request handler
+UNSUPPORTED_OPTIONS = frozenset([
+    'endpoint_table',
+    'intercept_exceptions',
+])
+
+
+class CSPMiddleware:
+    """
+    Wraps `app.wsgi_app` and appends the compiled CSP headers in `start_response`.
+
+    This covers every response of the app the same way, including static
+    files, error pages and responses that never reach the after request
+    handlers. Responses which already have a CSP header, e.g. from the
+    decorator or a blueprint initialized with the extension, are left alone.
+
+    The options are those of the extension, except for `endpoint_table` and
+    `intercept_exceptions`, which raise a TypeError:
+
+        app = Flask(__name__)
+        CSPMiddleware(app, img_src=['self', 'img.example.com'])
+    """
+
+    def __init__(self, app, **kwargs):
+        unsupported = UNSUPPORTED_OPTIONS.intersection(kwargs)
+        if unsupported:
+            raise TypeError(f'CSPMiddleware does not support the {", ".join(sorted(unsupported))} '
+                            'options')
+
+        options = get_csp_options(app, kwargs)
+
+        # Allow the static inline scripts and styles of the templates by their hashes
+        if options.get('hash_inline'):
+            hashes = collect_inline_hashes(app, cache_path=options.get('hash_cache'))
+            for directive, sources in hashes.items():
+                if sources:
+                    add_sources(options, directive, *sources)
+
+        if options.get('metrics'):
+            METRICS.enable()
+
+        self.wsgi_app = app.wsgi_app
+        self.policy = CompiledPolicy(options)
+
+        app.add_template_global(csp_nonce)
+        app.wsgi_app = self
+
+    def __call__(self, environ, start_response):
+        def csp_start_response(status, headers, exc_info=None):
+            if not any(key.lower() in CSP_HEADER_KEYS for key, _ in headers):
+                csp_headers = self.get_headers(environ)
+                headers = list(headers)
+                headers.extend(csp_headers)
+
+                if METRICS.enabled and csp_headers:
+                    HEADER_BYTES.observe(
+                        sum(len(key) + len(value) + 4 for key, value in csp_headers),
+                        request.endpoint if has_request_context() else None,
+                    )
+
+            return start_response(status, headers, exc_info)
+
+        return self.wsgi_app(environ, csp_start_response)
+
+    def get_headers(self, environ):
+        """Returns the `(key, value)` header pairs for the request"""
+
+        policy = environ.get(POLICY_ENVIRON_KEY, self.policy)
+        if not policy:
+            return ()
+
+        if not isinstance(policy, CompiledPolicy):
+            return policy
+
+        if not policy.nonce:
+            return policy.render()
+
+        # The request's nonce was not used by any template
+        nonce = environ.get(NONCE_ENVIRON_KEY)
+        if nonce is None:
+            nonce = environ[NONCE_ENVIRON_KEY] = NONCES.get()
+
+        return policy.render(nonce)
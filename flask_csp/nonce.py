@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+flask_csp.nonce
+~~~~
+Per-request nonces which allow specific inline scripts and styles.
+"""
+
+import base64
+import os
+import threading
+
+from flask import request
+
+
+# Key under which the nonce of a request is stored in its WSGI environ
+NONCE_ENVIRON_KEY = 'flask_csp.nonce'
+
+# Placeholder that is rendered into the header and replaced by the request's nonce
+NONCE_SLOT = '{csp-nonce}'
+NONCE_SOURCE = f"'nonce-{NONCE_SLOT}'"
+
+# Directives which get the nonce source when the `nonce` option is `True`
+NONCE_DIRECTIVES = ('script_src', 'style_src',)
+
+
+class NoncePool:  # pylint: disable=too-few-public-methods
+    """
+    Hands out base64 encoded nonces. The random bytes are read from the OS in
+    batches and sliced up, rather than making a syscall for every nonce.
+    """
+
+    def __init__(self, nonce_size=16, batch_size=256):
+        self.nonce_size = nonce_size
+        self.batch_size = batch_size
+
+        self._lock = threading.Lock()
+        self._buffer = b''
+        self._offset = 0
+        self._pid = None
+
+    def get(self):
+        """Returns a new nonce"""
+
+        with self._lock:
+            # A forked worker must not hand out the same nonces as its parent
+            if (self._pid != os.getpid()
+                    or self._offset + self.nonce_size > len(self._buffer)):
+                self._buffer = os.urandom(self.nonce_size * self.batch_size)
+                self._offset = 0
+                self._pid = os.getpid()
+
+            chunk = self._buffer[self._offset:self._offset + self.nonce_size]
+            self._offset += self.nonce_size
+
+        return base64.b64encode(chunk).decode('ascii')
+
+
+NONCES = NoncePool()
+
+
+def csp_nonce():
+    """
+    Returns the nonce of the current request, generating it on first use. This
+    is available in templates as `csp_nonce()`, i.e.:
+
+        <script nonce="{{ csp_nonce() }}">...</script>
+    """
+
+    environ = request.environ
+    nonce = environ.get(NONCE_ENVIRON_KEY)
+    if nonce is None:
+        nonce = environ[NONCE_ENVIRON_KEY] = NONCES.get()
+
+    return nonce
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+flask_csp.periodic
+~~~~
+A background thread calling a function at a fixed interval, for the
+aggregator flushes and the retention pruning.
+"""
+
+import atexit
+import logging
+import threading
+
+
+LOG = logging.getLogger('flask_csp.receiver')
+
+
+class PeriodicThread:
+    """
+    Calls `func` every `interval` seconds from a daemon thread once started,
+    logging its errors, then `on_stop` once stopped, which happens at exit at
+    the latest.
+    """
+
+    def __init__(self, func, interval, *, name, on_stop=None):
+        self.func = func
+        self.interval = interval
+        self.name = name
+        self.on_stop = on_stop
+
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Starts the background thread"""
+
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def stop(self, timeout=None):
+        """Stops the background thread, waiting for a running call to finish"""
+
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+            atexit.unregister(self.stop)
+
+        if self.on_stop is not None:
+            self.on_stop()
+
+    def run(self):
+        """Loop of the background thread"""
+
+        while not self._stopped.wait(self.interval):
+            try:
+                self.func()
+
+            except Exception as exc:  # pylint: disable=broad-except
+                LOG.exception(exc)
@@ -5,27 +5,127 @@ policy
 """
 # pylint: disable=missing-function-docstring,too-few-public-methods,missing-class-docstring
 
+import collections
+import functools
 import json
+import re
+import sys
 from enum import Enum
 
 from .constants import Directive, FetchRestriction, SandboxRestriction, TrustedTypesRestriction
 
 
+def normalize_enum_key(item):
+    return str(item).upper().replace('-','_').replace("'",'').replace(':','')
+
+
+def build_enum_index(type_):
+    """
+    Returns a dict mapping the normalized names of the enum's members, as well
+    as their most common spellings, to the members
+    """
+
+    index = {member.name: member for member in type_}
+    for member in type_:
+        for spelling in (member.value, member.name.lower(), str(member.value).lower()):
+            if normalize_enum_key(spelling) == member.name:
+                index.setdefault(spelling, member)
+
+    return index
+
+
+ENUM_INDEXES = {
+    type_: build_enum_index(type_)
+    for type_ in (Directive, FetchRestriction, SandboxRestriction, TrustedTypesRestriction)
+}
+
+
+# The flags of a serialized `sandbox` directive
+SANDBOX_FLAGS = {member.value: member for member in SandboxRestriction}
+
+# The source keywords and schemes of a serialized policy, which browsers only
+# read as such when quoted or followed by a colon
+SOURCE_KEYWORDS = {member.value.lower(): member for member in FetchRestriction}
+
+
+def lookup_enum_value(type_, item):
+    """Returns the member of the enum that the item refers to, or None"""
+
+    if isinstance(item, type_):
+        return item
+
+    index = ENUM_INDEXES.get(type_)
+    if index is None:
+        index = ENUM_INDEXES[type_] = build_enum_index(type_)
+
+    if not isinstance(item, str):
+        item = str(item)
+
+    member = index.get(item)
+    if member is None:
+        member = index.get(normalize_enum_key(item))
+
+    return member
+
+
 def is_allowed_enum_value(type_, item, allowed=None):
-    if not isinstance(item, type_):
-        try:
-            maybe_key = str(item).upper().replace('-','_').replace("'",'').replace(':','')
-            item = type_[maybe_key]
-        except KeyError as exc:
-            raise ValueError(f'Not a valid {type_.__name__}: {item}') from exc
+    member = lookup_enum_value(type_, item)
+    if member is None:
+        raise ValueError(f'Not a valid {type_.__name__}: {item}')
+
+    if allowed and member not in allowed:
+        raise ValueError(f'{member.value} is not accepted. Can only be one of {str(allowed)}')
+
+    return member
+
+
+class CustomDirective(collections.namedtuple('CustomDirective', ('name', 'value'))):
+    """
+    A directive missing from the Directive enum, e.g. a newer CSP directive,
+    registered by name with `register_directive_class`. It has the `name`
+    and `value` of a Directive, e.g. `FENCED_FRAME_SRC` and `fenced-frame-src`.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_name(cls, name):
+        value = str(name).lower().replace('_', '-')
+        if not DIRECTIVE_NAME.fullmatch(value):
+            raise ValueError(f'Not a valid directive name: {name}')
 
-    if allowed and item not in allowed:
-        raise ValueError(f'{item.value} is not accepted. Can only be one of {str(allowed)}')
+        return cls(normalize_enum_key(value), value)
+
+
+DIRECTIVE_NAME = re.compile(r'[a-z0-9]+(-[a-z0-9]+)*')
+
+# Maps the normalized names of the registered CustomDirectives to them
+CUSTOM_DIRECTIVES = {}
+
+
+def lookup_directive(item):
+    """Returns the Directive or registered CustomDirective that the item refers to, or None"""
+
+    if isinstance(item, CustomDirective):
+        return item
+
+    member = lookup_enum_value(Directive, item)
+    if member is None and CUSTOM_DIRECTIVES:
+        member = CUSTOM_DIRECTIVES.get(normalize_enum_key(item))
+
+    return member
 
-    return item
 
 def is_allowed_directive(item, allowed=None):
-    return is_allowed_enum_value(Directive, item, allowed)
+    member = lookup_directive(item)
+    if member is None:
+        raise ValueError(f'Not a valid Directive: {item}')
+
+    # A CustomDirective is only handled by the class it was registered with
+    if allowed and isinstance(member, Directive) and member not in allowed:
+        raise ValueError(f'{member.value} is not accepted. Can only be one of {str(allowed)}')
+
+    return member
 
 
 def is_allowed_fetch_restriction(item, allowed=None):
@@ -44,9 +144,9 @@ class BaseDirective:
     """A base class for all Directives"""
 
     directive = None
-    restrictions = []
+    restrictions = ()
 
-    _allowed = list(Directive)
+    _allowed = frozenset(Directive)
 
     def __init__(self, directive, *restrictions):
         self.directive = is_allowed_directive(directive, self._allowed)
@@ -54,6 +154,18 @@ class BaseDirective:
         for restriction in restrictions:
             self.add(restriction)
 
+    @classmethod
+    def load(cls, directive, *restrictions):
+        """Creates the directive from the arguments passed to `load_directive`"""
+
+        return cls(directive, *restrictions)
+
+    @classmethod
+    def from_tokens(cls, directive, *tokens):
+        """Creates the directive from the tokens of a serialized policy"""
+
+        return cls.load(directive, *tokens)
+
     def __str__(self):
         restrictions = []
 
@@ -82,13 +194,20 @@ class BaseDirective:
         elif isinstance(self.restrictions, tuple):
             self.restrictions = self.restrictions + (restriction,)
 
+    def freeze(self):
+        return FrozenDirective(self.directive, *self.restrictions)
+
 
 class EmptyDirective(BaseDirective):
     """EmptyDirectives are a single command directive with no extra values"""
 
-    _allowed = [
+    _allowed = frozenset([
         Directive.UPGRADE_INSECURE_REQUESTS,
-    ]
+    ])
+
+    @classmethod
+    def load(cls, directive, *restrictions):
+        return cls(directive)
 
     def __str__(self):
         return self.directive.value
@@ -98,15 +217,18 @@ class EmptyDirective(BaseDirective):
 
 
 class SimpleDirective(BaseDirective):
-    """SimpleDirectives are single command directives with a single value"""
+    """
+    SimpleDirectives are single command directives with a single value, except
+    for `report-uri`, which can list several URIs
+    """
 
-    _allowed = [
+    _allowed = frozenset([
         Directive.REPORT_TO,
         Directive.REPORT_URI,
-    ]
+    ])
 
     def __str__(self):
-        return f'{self.directive.value} {self.restrictions[0]}'
+        return ' '.join([self.directive.value] + [str(item) for item in self.restrictions])
 
     def add(self, restriction):
         if not restriction:
@@ -115,7 +237,7 @@ class SimpleDirective(BaseDirective):
         if isinstance(restriction, Enum):
             raise ValueError('You can only add string value restrictions to a SimpleDirective')
 
-        if self.restrictions:
+        if self.restrictions and self.directive != Directive.REPORT_URI:
             raise ValueError('You cannot add multiple restrictions to a SimpleDirective.')
 
         super().add(restriction)
@@ -124,48 +246,62 @@ class SimpleDirective(BaseDirective):
 class SandboxDirective(BaseDirective):
     """SandboxDirectives are single command directives with multiple values from a special set"""
 
-    _allowed = [
+    _allowed = frozenset([
         Directive.SANDBOX,
-    ]
+    ])
 
     def __init__(self, *restrictions):
         super().__init__(Directive.SANDBOX)
         for restriction in restrictions:
             self.add(restriction)
 
+    @classmethod
+    def load(cls, directive, *restrictions):
+        return cls(*restrictions)
+
+    @classmethod
+    def from_tokens(cls, directive, *tokens):
+        """
+        Creates the directive from the tokens of a serialized policy. Browsers
+        ignore unknown flags but still apply the sandbox, so they are dropped.
+        """
+
+        return cls(*(SANDBOX_FLAGS[token] for token in map(str.lower, tokens)
+                     if token in SANDBOX_FLAGS))
+
     def add(self, restriction):
         if not restriction:
             raise ValueError('Cannot add an empty restriction to a directive')
 
-        try:
-            super().add(is_allowed_sandbox_restriction(restriction))
+        member = lookup_enum_value(SandboxRestriction, restriction)
+        if member is None:
+            raise ValueError(f'{restriction} is not an allowed SANDBOX restriction')
 
-        except ValueError as exc:
-            raise ValueError(
-                f'{restriction} is not an allowed SANDBOX restriction') from exc
+        super().add(member)
 
 
 class TrustedTypesDirective(BaseDirective):
     """TrustedTypesDirectives are single command directives with multiple values"""
 
-    _allowed = [
+    _allowed = frozenset([
         Directive.TRUSTED_TYPES,
-    ]
+    ])
 
     def __init__(self, *restrictions):
         super().__init__(Directive.TRUSTED_TYPES)
         for restriction in restrictions:
             self.add(restriction)
 
+    @classmethod
+    def load(cls, directive, *restrictions):
+        return cls(*restrictions)
+
     def add(self, restriction):
         if not restriction:
             raise ValueError('Cannot add an empty restriction to a directive')
 
-        try:
-            super().add(is_allowed_trustedtype_restriction(restriction))
-
-        except ValueError:
-            super().add(str(restriction))
+        member = lookup_enum_value(TrustedTypesRestriction, restriction)
+        super().add(member if member is not None else str(restriction))
 
 
 class SourceDirective(BaseDirective):
@@ -174,24 +310,83 @@ class SourceDirective(BaseDirective):
     """
 
     # pylint: disable=protected-access
-    _allowed = [
-        item
-        for item in Directive
-        if item not in TrustedTypesDirective._allowed +
-            SandboxDirective._allowed +
-            SimpleDirective._allowed +
-            EmptyDirective._allowed
-    ]
+    _allowed = frozenset(Directive) - (
+        TrustedTypesDirective._allowed |
+        SandboxDirective._allowed |
+        SimpleDirective._allowed |
+        EmptyDirective._allowed
+    )
 
     def add(self, restriction):
         if not restriction:
             raise ValueError('Cannot add an empty restriction to a directive')
 
-        try:
-            super().add(is_allowed_fetch_restriction(restriction))
+        # Callables are rendered along with the directive
+        if callable(restriction):
+            super().add(restriction)
+            return
 
-        except ValueError:
-            super().add(str(restriction))
+        member = lookup_enum_value(FetchRestriction, restriction)
+        super().add(member if member is not None else str(restriction))
+
+    @classmethod
+    def from_tokens(cls, directive, *tokens):
+        """
+        Creates the directive from the source tokens of a serialized policy.
+        Unlike `add`, only the exact keywords and schemes, e.g. `'self'` or
+        `data:`, are read as such, since browsers read `self` as a host.
+        """
+
+        instance = cls(directive)
+        for token in tokens:
+            member = SOURCE_KEYWORDS.get(token.lower())
+            BaseDirective.add(instance, member if member is not None else token)
+
+        return instance
+
+
+# Maps every Directive, and every CustomDirective, to the class that load_directive creates for it
+DIRECTIVE_CLASSES = {}
+
+
+def register_directive_class(directive_class=None, *, directives=None):
+    """
+    Registers the class that `load_directive` creates for the directives,
+    replacing any class previously registered for them. The directives default
+    to the class's `_allowed` directives. Names missing from the Directive enum
+    are registered as CustomDirectives:
+
+        register_directive_class(SourceDirective, directives=['fenced-frame-src'])
+
+    Can be used as a class decorator.
+    """
+
+    def register(directive_class):
+        # pylint: disable=protected-access
+        for directive in (directives or directive_class._allowed):
+            member = lookup_directive(directive)
+            if member is None:
+                member = CustomDirective.from_name(directive)
+                CUSTOM_DIRECTIVES[member.name] = member
+
+            DIRECTIVE_CLASSES[is_allowed_directive(member, directive_class._allowed)] = \
+                directive_class
+
+        return directive_class
+
+    if directive_class is None:
+        return register
+
+    return register(directive_class)
+
+
+for _directive_class in (
+        SourceDirective,
+        SimpleDirective,
+        EmptyDirective,
+        SandboxDirective,
+        TrustedTypesDirective,):
+    register_directive_class(_directive_class)
 
 
 def load_directive(string, *restrictions):
@@ -202,25 +397,192 @@ def load_directive(string, *restrictions):
 
     directive = is_allowed_directive(string)
 
-    if directive in SourceDirective._allowed:  # pylint: disable=protected-access
-        return SourceDirective(directive, *restrictions)
+    directive_class = DIRECTIVE_CLASSES.get(directive)
+    if directive_class is None:
+        raise ValueError(f'Unhandled directive type: {directive.value}')
+
+    return directive_class.load(directive, *restrictions)
+
+
+# The directives that each fetch directive falls back to when it is not set
+FETCH_FALLBACKS = {
+    Directive.SCRIPT_SRC_ELEM: (Directive.SCRIPT_SRC, Directive.DEFAULT_SRC),
+    Directive.SCRIPT_SRC_ATTR: (Directive.SCRIPT_SRC, Directive.DEFAULT_SRC),
+    Directive.STYLE_SRC_ELEM: (Directive.STYLE_SRC, Directive.DEFAULT_SRC),
+    Directive.STYLE_SRC_ATTR: (Directive.STYLE_SRC, Directive.DEFAULT_SRC),
+    Directive.WORKER_SRC: (Directive.CHILD_SRC, Directive.SCRIPT_SRC, Directive.DEFAULT_SRC),
+    Directive.FRAME_SRC: (Directive.CHILD_SRC, Directive.DEFAULT_SRC),
+    Directive.CHILD_SRC: (Directive.DEFAULT_SRC,),
+    Directive.CONNECT_SRC: (Directive.DEFAULT_SRC,),
+    Directive.FONT_SRC: (Directive.DEFAULT_SRC,),
+    Directive.IMG_SRC: (Directive.DEFAULT_SRC,),
+    Directive.MANIFEST_SRC: (Directive.DEFAULT_SRC,),
+    Directive.MEDIA_SRC: (Directive.DEFAULT_SRC,),
+    Directive.OBJECT_SRC: (Directive.DEFAULT_SRC,),
+    Directive.PREFETCH_SRC: (Directive.DEFAULT_SRC,),
+    Directive.SCRIPT_SRC: (Directive.DEFAULT_SRC,),
+    Directive.STYLE_SRC: (Directive.DEFAULT_SRC,),
+}
+
+HOST_SOURCE = re.compile(
+    r'^(?:(?P<scheme>[a-z][a-z0-9+.-]*)://)?'
+    r'(?P<host>\*|(?:\*\.)?[a-z0-9-]+(?:\.[a-z0-9-]+)*)'
+    r'(?::(?P<port>[0-9]+|\*))?'
+    r'(?P<path>/.*)?$',
+    re.IGNORECASE,
+)
+SCHEME_SOURCE = re.compile(r'^(?P<scheme>[a-z][a-z0-9+.-]*):$', re.IGNORECASE)
+
+# Schemes matched by the `*` source, besides the scheme of the protected resource
+WILDCARD_SCHEMES = frozenset([None, 'http', 'https', 'ws', 'wss'])
+
+
+def parse_host_source(source):
+    """Returns the `(scheme, host, port, path)` of a host source, or None"""
+
+    match = HOST_SOURCE.match(source)
+    if match is None:
+        return None
+
+    scheme, host, port, path = match.group('scheme', 'host', 'port', 'path')
+    return (scheme.lower() if scheme else None, host.lower(), port, path)
+
+
+def is_covered_source(source, other):
+    """
+    Returns whether everything allowed by the source is also allowed by the
+    other source. Only the cases which are certain are recognized.
+    """
+
+    host_source = parse_host_source(source)
+    if host_source is None:
+        return False
+    scheme, host, port, _ = host_source
 
-    if directive in SimpleDirective._allowed:  # pylint: disable=protected-access
-        return SimpleDirective(directive, *restrictions)
+    scheme_source = SCHEME_SOURCE.match(other)
+    if scheme_source is not None:
+        return scheme == scheme_source.group('scheme').lower()
 
-    if directive in EmptyDirective._allowed:  # pylint: disable=protected-access
-        return EmptyDirective(directive)
+    other_source = parse_host_source(other)
+    if other_source is None:
+        return False
+    other_scheme, other_host, other_port, other_path = other_source
 
-    if directive in SandboxDirective._allowed:  # pylint: disable=protected-access
-        return SandboxDirective(*restrictions)
+    # A bare `*` allows any host and port, but only with some schemes
+    if other_host == '*' and other_scheme is None and other_port is None and other_path is None:
+        return scheme in WILDCARD_SCHEMES
 
-    if directive in TrustedTypesDirective._allowed:  # pylint: disable=protected-access
-        return TrustedTypesDirective(*restrictions)
+    # Without a path, a host source allows every path, but only the default port
+    return (
+        other_scheme == scheme
+        and other_port == port
+        and other_path is None
+        and is_covered_host(host, other_host)
+    )
 
-    raise ValueError(f'Unhandled directive type: {directive.value}')
 
+def is_covered_host(host, other):
+    """Returns whether the host part of a source is matched by the other host part"""
+
+    if other == '*':
+        return True
+
+    if other.startswith('*.'):
+        return host.endswith(other[1:]) and host != other
+
+    return host == other
+
+
+def render_token(restriction):
+    return restriction.value if isinstance(restriction, Enum) else str(restriction)
+
+
+def minify_restrictions(restrictions):
+    """
+    Returns the restrictions without duplicates and without host sources that
+    are covered by another source of the same directive
+    """
+
+    rendered = {}
+    for restriction in restrictions:
+        rendered.setdefault(render_token(restriction), restriction)
+
+    tokens = list(rendered)
+
+    def is_redundant(index, token):
+        # Of two equivalent sources, the first one is kept
+        return any(
+            is_covered_source(token, other)
+            and (other_index < index or not is_covered_source(other, token))
+            for other_index, other in enumerate(tokens)
+            if other_index != index
+        )
+
+    return [
+        rendered[token] for index, token in enumerate(tokens)
+        if not is_redundant(index, token)
+    ]
+
+
+def minify_directives(directives):
+    """
+    Returns a list of equivalent directives, with minified source lists and
+    without the fetch directives whose sources are the same as those of the
+    directive they fall back to. Directives with callable restrictions are
+    left untouched.
+    """
+
+    def is_static_source(directive):
+        return isinstance(directive, SourceDirective) and not any(
+            callable(restriction) for restriction in directive.restrictions)
+
+    # Browsers ignore repeated directives, only the first one counts
+    minified = {}
+    for directive in directives:
+        if directive.directive in minified:
+            continue
+
+        if is_static_source(directive):
+            directive = directive.load(
+                directive.directive, *minify_restrictions(directive.restrictions))
+        minified[directive.directive] = directive
+
+    def sources(name):
+        directive = minified.get(name)
+        if directive is None or not is_static_source(directive):
+            return None
+        return frozenset(render_token(restriction) for restriction in directive.restrictions)
+
+    default_sources = sources(Directive.DEFAULT_SRC)
+
+    removed = default_sources is not None
+    while removed:
+        removed = False
+        for name in list(minified):
+            if name not in FETCH_FALLBACKS or sources(name) != default_sources:
+                continue
+
+            # Without it, the directive and every unset directive which falls
+            # back to it must fall back to default-src
+            affected = [name] + [
+                item for item, chain in FETCH_FALLBACKS.items()
+                if name in chain and item not in minified
+            ]
+            if any(
+                    fallback in minified
+                    for item in affected
+                    for fallback in FETCH_FALLBACKS[item][:-1]
+                    if fallback != name):
+                continue
+
+            del minified[name]
+            removed = True
+
+    return list(minified.values())
 
 class Header:
+    __slots__ = ()
+
     @property
     def key(self):
         raise NotImplementedError()
@@ -236,7 +598,7 @@ class Header:
 class ReportGroup:
     name = None
     max_age = 3600
-    endpoints = []
+    endpoints = ()
 
     def __init__(self, name, endpoints, max_age=None):
         self.name = name
@@ -265,11 +627,14 @@ class ReportGroup:
         }
         return json.dumps(value, sort_keys=True)
 
+    def freeze(self):
+        return FrozenReportGroup(self.name, self.endpoints, max_age=self.max_age)
+
 
 class ReportTo(Header):
 
     key = 'Report-To'
-    groups = []
+    groups = ()
 
     def __init__(self, *groups):
         self.groups = []
@@ -293,10 +658,36 @@ class ReportTo(Header):
         else:
             raise ValueError('Provided report group was invalid')
 
+    def freeze(self):
+        return FrozenReportTo(*[group.freeze() for group in self.groups])
+
+
+def render_reporting_endpoints(groups):
+    return ', '.join([
+        f'{group.name}="{group.endpoints[0]}"'
+        for group in groups if group.endpoints
+    ])
+
+
+class ReportingEndpoints(ReportTo):
+    """
+    The successor of the `Report-To` header, which maps each group name to a
+    single endpoint. Only the first endpoint of each group is used.
+    """
+
+    key = 'Reporting-Endpoints'
+
+    @property
+    def value(self):
+        return render_reporting_endpoints(self.groups)
+
+    def freeze(self):
+        return FrozenReportingEndpoints(*[group.freeze() for group in self.groups])
+
 
 class ContentSecurityPolicy(Header):
     key = 'Content-Security-Policy'
-    directives = []
+    directives = ()
 
     def __init__(self, *directives):
         self.directives = []
@@ -317,6 +708,27 @@ class ContentSecurityPolicy(Header):
         else:
             raise ValueError('Provided directive was invalid')
 
+    def freeze(self):
+        return FrozenPolicy(self.key, *[directive.freeze() for directive in self.directives])
+
+    @classmethod
+    def parse(cls, value, strict=False):
+        """Returns a new policy with the directives of a serialized policy"""
+
+        return cls(*[
+            load_tokens(directive.directive, *directive.restrictions)
+            for directive in parse_directives(value, strict=strict)
+        ])
+
+    def minify(self):
+        """
+        Returns an equivalent policy without duplicate sources, without sources
+        covered by another source of the same directive, and without fetch
+        directives which are identical to the directive they fall back to
+        """
+
+        return type(self)(minify_directives(self.directives))
+
 
 class ReportOnlyPolicy(ContentSecurityPolicy):
     key = 'Content-Security-Policy-Report-Only'
@@ -332,3 +744,250 @@ class ReportOnlyPolicy(ContentSecurityPolicy):
             raise ValueError('There must be a report-to directive when using a report-only policy!')
 
         return super().value
+
+
+def render_restriction(restriction):
+    if callable(restriction):
+        raise ValueError('Callable restrictions cannot be frozen')
+
+    if isinstance(restriction, Enum):
+        return restriction.value
+
+    return sys.intern(str(restriction))
+
+
+class Frozen:
+    """
+    Base class for the immutable variants of the policy classes. These can be
+    shared between threads and used as dict keys. They are usually created
+    through the `freeze()` method of their mutable counterparts.
+    """
+
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def _set(self, name, value):
+        object.__setattr__(self, name, value)
+
+
+# The attributes of the frozen classes are slots set through `_set`, which pylint
+# cannot follow, and they replace the abstract properties of Header
+# pylint: disable=no-member,abstract-method
+
+
+class FrozenDirective(Frozen):
+    """A directive with deduplicated restrictions, which is only rendered once"""
+
+    __slots__ = ('directive', 'restrictions', '_str', '_hash',)
+
+    def __init__(self, directive, *restrictions):
+        self._set('directive', is_allowed_directive(directive))
+        self._set('restrictions', tuple(dict.fromkeys(
+            render_restriction(restriction) for restriction in restrictions
+        )))
+        self._set('_str', ' '.join((self.directive.value,) + self.restrictions))
+        self._set('_hash', hash((self.directive, self.restrictions)))
+
+    def __str__(self):
+        return self._str
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self._str!r})'
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if not isinstance(other, FrozenDirective):
+            return NotImplemented
+
+        return self.directive == other.directive and self.restrictions == other.restrictions
+
+
+class FrozenReportGroup(Frozen):
+    __slots__ = ('name', 'max_age', 'endpoints', '_str',)
+
+    def __init__(self, name, endpoints, max_age=None):
+        if not isinstance(endpoints, (list, set, tuple,)):
+            endpoints = [endpoints] if endpoints else []
+
+        self._set('name', sys.intern(name))
+        self._set('max_age', int(max_age) if max_age is not None and int(max_age) > 0 else 3600)
+        self._set('endpoints', tuple(dict.fromkeys(sys.intern(item) for item in endpoints)))
+        self._set('_str', json.dumps({
+            "group": self.name,
+            "max_age": self.max_age,
+            "endpoints": [{"url": endpoint} for endpoint in self.endpoints],
+        }, sort_keys=True))
+
+    def __str__(self):
+        return self._str
+
+    def __hash__(self):
+        return hash(self._str)
+
+    def __eq__(self, other):
+        if not isinstance(other, FrozenReportGroup):
+            return NotImplemented
+
+        return self._str == other._str
+
+
+class FrozenHeader(Frozen, Header):
+    """A header whose value is rendered once"""
+
+    __slots__ = ('key', 'value',)
+
+    def __hash__(self):
+        return hash((self.key, self.value))
+
+    def __eq__(self, other):
+        if not isinstance(other, FrozenHeader):
+            return NotImplemented
+
+        return self.key == other.key and self.value == other.value
+
+
+class FrozenReportTo(FrozenHeader):
+    __slots__ = ('groups',)
+
+    def __init__(self, *groups):
+        self._set('key', ReportTo.key)
+        self._set('groups', tuple(dict.fromkeys(groups)))
+        self._set('value', ','.join([str(group) for group in self.groups]))
+
+
+class FrozenReportingEndpoints(FrozenHeader):
+    __slots__ = ('groups',)
+
+    def __init__(self, *groups):
+        self._set('key', ReportingEndpoints.key)
+        self._set('groups', tuple(dict.fromkeys(groups)))
+        self._set('value', render_reporting_endpoints(self.groups))
+
+
+class FrozenPolicy(FrozenHeader):
+    __slots__ = ('directives',)
+
+    def __init__(self, key, *directives):
+        if key not in (ContentSecurityPolicy.key, ReportOnlyPolicy.key):
+            raise ValueError(f'Not a valid policy header: {key}')
+
+        self._set('key', key)
+        self._set('directives', tuple(dict.fromkeys(directives)))
+
+        if key == ReportOnlyPolicy.key and not any(
+                item.directive in (Directive.REPORT_TO, Directive.REPORT_URI)
+                for item in self.directives):
+            raise ValueError('There must be a report-to directive when using a report-only policy!')
+
+        self._set('value', '; '.join([str(directive) for directive in self.directives]))
+
+
+# pylint: enable=no-member,abstract-method
+
+
+# The number of distinct serialized policies whose parsed form is cached
+POLICY_CACHE_SIZE = 256
+
+ASCII_WHITESPACE = re.compile(r'[\t\n\f\r ]+')
+
+
+def tokenize_policy(value):
+    """
+    Yields the `(name, tokens)` pairs of the directives of a serialized policy,
+    with lowercase names, skipping empty directives
+    """
+
+    for item in value.split(';'):
+        tokens = ASCII_WHITESPACE.split(item.strip('\t\n\f\r '))
+        if tokens[0]:
+            yield tokens[0].lower(), tokens[1:]
+
+
+def load_tokens(name, *tokens):
+    """
+    Returns the directive for the name and tokens of a directive of a
+    serialized policy, reading them as a browser does
+    """
+
+    directive = is_allowed_directive(name)
+    directive_class = DIRECTIVE_CLASSES.get(directive)
+    if directive_class is None:
+        raise ValueError(f'Unhandled directive type: {directive.value}')
+
+    return directive_class.from_tokens(directive, *tokens)
+
+
+@functools.lru_cache(maxsize=POLICY_CACHE_SIZE)
+def parse_directives(value, strict=False):
+    """
+    Returns the directives of a serialized policy as a tuple of FrozenDirectives.
+
+    Browsers only enforce the first of repeated directives, so the others are
+    dropped. Unknown or invalid directives are dropped as well, unless `strict`
+    is set, in which case they raise a ValueError.
+    """
+
+    directives = {}
+    for name, tokens in tokenize_policy(value):
+        try:
+            directive = load_tokens(name, *tokens).freeze()
+
+        except ValueError:
+            if strict:
+                raise
+            continue
+
+        directives.setdefault(directive.directive, directive)
+
+    return tuple(directives.values())
+
+
+@functools.lru_cache(maxsize=POLICY_CACHE_SIZE)
+def parse_policy(value, report_only=False, strict=False):
+    """
+    Returns a serialized policy, such as the value of a CSP header or the
+    `original-policy` of a report, as a FrozenPolicy. Results are cached by value.
+    """
+
+    key = ReportOnlyPolicy.key if report_only else ContentSecurityPolicy.key
+    return FrozenPolicy(key, *parse_directives(value, strict=strict))
+
+
+def parse_options(value):
+    """
+    Returns the directives of a serialized policy as options for the extension
+    and the decorator:
+
+        CSP(app, **parse_options("default-src 'self'; img-src *"))
+    """
+
+    options = {}
+    for directive in parse_directives(value, strict=True):
+        directive_class = DIRECTIVE_CLASSES[directive.directive]
+        if directive_class is EmptyDirective:
+            restrictions = True
+        elif not directive.restrictions and not issubclass(directive_class, SourceDirective):
+            raise ValueError(
+                f'An empty {directive.directive.value} cannot be expressed as an option')
+        else:
+            # An empty source list blocks everything
+            restrictions = list(directive.restrictions) or [FetchRestriction.NONE.value]
+
+            # The options read bare keywords as keywords, unlike browsers
+            for restriction in restrictions:
+                if (restriction.lower() not in SOURCE_KEYWORDS
+                        and lookup_enum_value(FetchRestriction, restriction) is not None):
+                    raise ValueError(
+                        f'{restriction} is a host in {directive.directive.value}, '
+                        'which cannot be expressed as an option')
+
+        options[directive.directive.name.lower()] = restrictions
+
+    return options
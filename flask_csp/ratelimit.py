@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+flask_csp.ratelimit
+~~~~
+Rate limiting of the report receivers, checked before the submitted report is
+read so that a flood of reports is rejected as cheaply as possible.
+"""
+
+import collections
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+class TokenBuckets:
+    """
+    Token buckets per key, each holding up to `burst` tokens and refilled at
+    `rate` tokens per second. The buckets of at most `max_keys` keys are kept,
+    the least recently used key being forgotten first.
+    """
+
+    def __init__(self, rate, burst=None, max_keys=10000):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(rate, 1))
+        self.max_keys = max_keys
+
+        self._buckets = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._buckets)
+
+    def take(self, key=None, now=None):
+        """Takes a token from the key's bucket, returns False if it was empty"""
+
+        if now is None:
+            now = time.monotonic()
+
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = self.burst
+                if len(self._buckets) >= self.max_keys:
+                    self._buckets.popitem(last=False)
+
+            else:
+                tokens, last = bucket
+                tokens = min(self.burst, tokens + (now - last) * self.rate)
+                self._buckets.move_to_end(key)
+
+            allowed = tokens >= 1
+            self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+
+        return allowed
+
+
+def get_origin(environ):
+    """Returns the origin of the document that sent the report, or None"""
+
+    origin = environ.get('HTTP_ORIGIN')
+    if origin and origin != 'null':
+        return origin
+
+    referer = environ.get('HTTP_REFERER')
+    if referer:
+        parts = urlsplit(referer)
+        if parts.netloc:
+            return f'{parts.scheme}://{parts.netloc}'
+
+    return None
+
+
+class ReportLimiter:  # pylint: disable=too-few-public-methods
+    """
+    Limits the reports accepted by the receivers:
+
+    * `client_rate` reports per second per client address, with bursts of
+      `client_burst` reports
+    * `origin_rate` reports per second per document origin, taken from the
+      `Origin` or `Referer` headers, with bursts of `origin_burst` reports
+    * a global `ceiling` of reports per second, with bursts of `ceiling_burst`
+      reports, above which only a `sample_rate` fraction of the reports is
+      accepted
+
+    Every limit is optional. Only the WSGI environ is read, never the body:
+
+        from flask_csp import utils
+
+        utils.LIMITER = ReportLimiter(client_rate=1, client_burst=20, ceiling=500)
+    """
+
+    # Each limit is an optional keyword argument
+    # pylint: disable-next=too-many-arguments
+    def __init__(self, *, client_rate=None, client_burst=None, origin_rate=None,
+                 origin_burst=None, ceiling=None, ceiling_burst=None, sample_rate=0.0,
+                 max_keys=10000):
+        self.clients = None
+        if client_rate is not None:
+            self.clients = TokenBuckets(client_rate, client_burst, max_keys=max_keys)
+
+        self.origins = None
+        if origin_rate is not None:
+            self.origins = TokenBuckets(origin_rate, origin_burst, max_keys=max_keys)
+
+        self.ceiling = None
+        if ceiling is not None:
+            self.ceiling = TokenBuckets(ceiling, ceiling_burst, max_keys=1)
+
+        self.sample_rate = sample_rate
+
+    def allow(self, environ):
+        """Returns whether a report with the WSGI environ should be accepted"""
+
+        now = time.monotonic()
+
+        if self.clients is not None and not self.clients.take(environ.get('REMOTE_ADDR'), now):
+            return False
+
+        if self.origins is not None:
+            origin = get_origin(environ)
+            if origin is not None and not self.origins.take(origin, now):
+                return False
+
+        if self.ceiling is not None and not self.ceiling.take(None, now):
+            return random.random() < self.sample_rate
+
+        return True
@@ -4,9 +4,10 @@ flask_csp.simple.views
 
 import logging
 
-from flask import abort, make_response, Blueprint
+from flask import abort, current_app, make_response, Blueprint
 
-from ..utils import get_submitted_report
+from ..metrics import METRICS, PROMETHEUS_CONTENT_TYPE, REPORTS_RECEIVED
+from ..utils import get_submitted_reports
 
 
 LOG = logging.getLogger('flask_csp.receiver')
@@ -34,7 +35,11 @@ def receiver():
 
     """
 
-    get_submitted_report()
+    csp_reports = get_submitted_reports()
+
+    if METRICS.enabled:
+        REPORTS_RECEIVED.inc('simple', amount=len(csp_reports))
+
     return make_response('', 204)
 
 
@@ -49,3 +54,17 @@ def review():
     """
 
     return abort(404)
+
+
+@CSP_BP.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Flask-CSP metrics in the Prometheus text format, when metrics are enabled
+    and the route is opted into with the `CSP_METRICS_ROUTE` configuration, as
+    the receiver is usually public
+    """
+
+    if not METRICS.enabled or not current_app.config.get('CSP_METRICS_ROUTE'):
+        return abort(404)
+
+    return make_response(METRICS.render(), 200, {'Content-Type': PROMETHEUS_CONTENT_TYPE})
@@ -2,7 +2,10 @@
 flask_csp.sqlalchemy.models
 """
 
-from sqlalchemy import db, func  # pylint: disable=import-error
+from sqlalchemy import db  # pylint: disable=import-error
+
+from ..aggregate import utcnow
+from ..policy import parse_policy
 
 
 class CspReport(db.Model):  # pylint: disable=too-few-public-methods
@@ -29,16 +32,55 @@ class CspReport(db.Model):  # pylint: disable=too-few-public-methods
     """
 
     __tablename__ = "csp_reports"
+    __table_args__ = (
+        # Backs the review's newest first pages, and the pruning of old reports
+        db.Index('ix_csp_reports_ts_id', 'ts', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    ts = db.Column(db.DateTime, default=func.now(), nullable=False)
+    # Naive UTC set by Python, the clock of the retention, rollups and aggregator
+    ts = db.Column(db.DateTime, default=utcnow, nullable=False)
 
-    blocked_uri = db.Column(db.String, nullable=False)
-    disposition = db.Column(db.String, nullable=False)
-    document_uri = db.Column(db.String, nullable=False)
+    blocked_uri = db.Column(db.String, nullable=False, index=True)
+    disposition = db.Column(db.String, nullable=False, index=True)
+    document_uri = db.Column(db.String, nullable=False, index=True)
     effective_directive = db.Column(db.String)
     original_policy = db.Column(db.String, nullable=False)
     referrer = db.Column(db.String)
     script_sample = db.Column(db.String)
     status_code = db.Column(db.Integer)
     violated_directive = db.Column(db.String)
+
+    # Identical reports are stored once when aggregated, `ts` being the first one
+    count = db.Column(db.Integer, default=1, server_default='1', nullable=False)
+    last_seen = db.Column(db.DateTime)
+
+    @property
+    def policy(self):
+        """The `original-policy` of the report as a FrozenPolicy"""
+
+        return parse_policy(self.original_policy)
+
+
+class CspReportRollup(db.Model):  # pylint: disable=too-few-public-methods
+    """
+    The number of reports per hour, directive, blocked origin, document path
+    and disposition, kept up to date as reports are stored, so that summaries
+    never read the reports themselves
+    """
+
+    __tablename__ = "csp_report_rollups"
+    __table_args__ = (
+        db.UniqueConstraint('hour', 'directive', 'blocked_origin', 'document_path', 'disposition',
+                            name='uq_csp_report_rollups'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    hour = db.Column(db.DateTime, nullable=False)
+
+    directive = db.Column(db.String, nullable=False)
+    blocked_origin = db.Column(db.String, nullable=False)
+    document_path = db.Column(db.String, nullable=False)
+    disposition = db.Column(db.String, nullable=False)
+
+    count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
@@ -0,0 +1,192 @@
+"""
+flask_csp.sqlalchemy.retention
+~~~~
+Deletion of old reports and rollups, in small batches along the `ts` index so
+that the reports table is never locked for long.
+"""
+
+import collections
+import logging
+import time
+from datetime import timedelta
+
+from sqlalchemy import and_, or_  # pylint: disable=import-error
+
+from ..aggregate import utcnow
+from ..periodic import PeriodicThread
+from .models import CspReport, CspReportRollup
+
+
+LOG = logging.getLogger('flask_csp.receiver')
+
+PRUNE_BATCH_SIZE = 1000
+
+
+class PruneBatches(collections.namedtuple('PruneBatches', ('size', 'pause'))):
+    """
+    The number of rows deleted per transaction, and the seconds slept between
+    transactions to let other queries through
+    """
+
+    __slots__ = ()
+
+
+def get_retention(app):
+    """
+    Returns the `max_age` and `max_rows` retention of the app's configuration,
+    `CSP_REPORT_MAX_AGE` being a number of days or a timedelta
+    """
+
+    max_age = app.config.get('CSP_REPORT_MAX_AGE')
+    if max_age is not None and not isinstance(max_age, timedelta):
+        max_age = timedelta(days=float(max_age))
+
+    return {
+        'max_age': max_age,
+        'max_rows': app.config.get('CSP_REPORT_MAX_ROWS'),
+    }
+
+
+def get_prune_filter(db, max_age=None, max_rows=None):
+    """
+    Returns the filter matching the reports older than `max_age`, or beyond
+    the newest `max_rows` reports, or None when no report needs to be deleted
+    """
+
+    filters = []
+    if max_age is not None:
+        filters.append(CspReport.ts < utcnow() - max_age)
+
+    if max_rows is not None:
+        with db.session.begin():
+            newest = (
+                CspReport.query
+                .with_entities(CspReport.ts, CspReport.id)
+                .order_by(CspReport.ts.desc(), CspReport.id.desc())
+                .offset(max_rows)
+                .first()
+            )
+
+        if newest is not None:
+            ts, report_id = newest
+            filters.append(or_(
+                CspReport.ts < ts,
+                and_(CspReport.ts == ts, CspReport.id <= report_id),
+            ))
+
+    if not filters:
+        return None
+
+    return or_(*filters)
+
+
+def delete_in_batches(db, model, prune_filter, order_by, batches):
+    """
+    Deletes the rows of the model matching the filter in the given order, in
+    the `PruneBatches` batches. Returns the number of deleted rows.
+    """
+
+    query = (
+        model.query
+        .with_entities(model.id)
+        .filter(prune_filter)
+        .order_by(*order_by)
+        .limit(batches.size)
+    )
+
+    deleted = 0
+    while True:
+        with db.session.begin():
+            ids = [row_id for (row_id,) in query]
+            if ids:
+                model.query.filter(model.id.in_(ids)).delete(synchronize_session=False)
+
+        deleted += len(ids)
+        if len(ids) < batches.size:
+            return deleted
+
+        if batches.pause:
+            time.sleep(batches.pause)
+
+
+def prune_reports(db, *, max_age=None, max_rows=None, batch_size=PRUNE_BATCH_SIZE, pause=0.0):
+    """
+    Deletes the reports older than the `max_age` timedelta, and those beyond
+    the newest `max_rows` reports, oldest first, `batch_size` reports per
+    transaction, sleeping `pause` seconds between transactions. Returns the
+    number of deleted reports.
+    """
+
+    prune_filter = get_prune_filter(db, max_age=max_age, max_rows=max_rows)
+    if prune_filter is None:
+        return 0
+
+    deleted = delete_in_batches(db, CspReport, prune_filter, (CspReport.ts, CspReport.id),
+                                PruneBatches(batch_size, pause))
+
+    LOG.info('Pruned %d CSP reports', deleted)
+    return deleted
+
+
+def prune_rollups(db, *, max_age=None, batch_size=PRUNE_BATCH_SIZE, pause=0.0):
+    """
+    Deletes the hourly rollups of the hours that ended before the `max_age`
+    timedelta, so that the summary never counts reports that were pruned.
+    `max_rows` does not apply, rollups being counts rather than reports.
+    Returns the number of deleted rollups.
+    """
+
+    if max_age is None:
+        return 0
+
+    cutoff = (utcnow() - max_age).replace(minute=0, second=0, microsecond=0)
+    deleted = delete_in_batches(db, CspReportRollup, CspReportRollup.hour < cutoff,
+                                (CspReportRollup.hour, CspReportRollup.id),
+                                PruneBatches(batch_size, pause))
+
+    LOG.info('Pruned %d CSP report rollups', deleted)
+    return deleted
+
+
+class RetentionScheduler:
+    """
+    Prunes the reports and rollups every `interval` seconds from a background thread,
+    with the app's retention configuration unless `max_age` or `max_rows` is
+    given:
+
+        from flask_csp.sqlalchemy.retention import RetentionScheduler
+
+        RetentionScheduler(app, db, interval=3600).start()
+    """
+
+    def __init__(self, app, db, *, interval=3600, batch_size=PRUNE_BATCH_SIZE, pause=0.1,
+                 **retention):
+        self.app = app
+        self.db = db
+        self.batches = PruneBatches(batch_size, pause)
+        self.retention = retention
+
+        self._thread = PeriodicThread(self.prune, interval, name='flask-csp-retention')
+
+    def start(self):
+        """Starts the background thread, returns the scheduler"""
+
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Stops the background thread, waiting for a running prune to finish"""
+
+        self._thread.stop(timeout)
+
+    def prune(self):
+        """Returns the number of deleted reports and rollups"""
+
+        with self.app.app_context():
+            retention = dict(get_retention(self.app), **self.retention)
+            reports = prune_reports(self.db, batch_size=self.batches.size,
+                                    pause=self.batches.pause, **retention)
+            rollups = prune_rollups(self.db, max_age=retention['max_age'],
+                                    batch_size=self.batches.size, pause=self.batches.pause)
+
+        return reports, rollups
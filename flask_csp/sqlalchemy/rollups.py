@@ -0,0 +1,100 @@
+"""
+flask_csp.sqlalchemy.rollups
+~~~~
+Incremental updates of the hourly report counts in `CspReportRollup`.
+"""
+
+import collections
+from urllib.parse import urlsplit
+
+from sqlalchemy.exc import IntegrityError  # pylint: disable=import-error
+
+from ..aggregate import utcnow
+from .models import CspReportRollup
+
+
+def get_blocked_origin(uri):
+    """
+    Returns the origin of a blocked URI, or the URI itself for the keywords
+    browsers report instead of a URL, such as `inline` or `eval`
+    """
+
+    parts = urlsplit(uri or '')
+    if parts.netloc:
+        return f'{parts.scheme}://{parts.netloc}'
+
+    return parts.scheme or uri or ''
+
+
+def get_document_path(uri):
+    """Returns the path of a document URI, without its query string"""
+
+    return urlsplit(uri or '').path or '/'
+
+
+def get_rollup_key(row, now=None):
+    """Returns the values of the rollup a row of report column values counts towards"""
+
+    ts = row.get('ts') or now or utcnow()
+
+    # Older browsers report the directive along with its sources
+    directive = row.get('effective_directive') or row.get('violated_directive') or ''
+    directive = directive.split(' ', 1)[0]
+
+    return (
+        ts.replace(minute=0, second=0, microsecond=0),
+        directive,
+        get_blocked_origin(row.get('blocked_uri')),
+        get_document_path(row.get('document_uri')),
+        row.get('disposition') or '',
+    )
+
+
+def count_rollups(rows):
+    """Returns the number of reports of the rows by rollup"""
+
+    now = utcnow()
+
+    counts = collections.Counter()
+    for row in rows:
+        counts[get_rollup_key(row, now)] += row.get('count') or 1
+
+    return counts
+
+
+def update_rollups(session, rows):
+    """
+    Adds the reports of the rows to their rollups, within the session's
+    current transaction. Each rollup is updated in place, or inserted when it
+    does not exist yet, retrying the update when another worker inserted it
+    in the meantime.
+    """
+
+    for (hour, directive, blocked_origin, document_path, disposition), count in \
+            count_rollups(rows).items():
+        query = session.query(CspReportRollup).filter_by(
+            hour=hour,
+            directive=directive,
+            blocked_origin=blocked_origin,
+            document_path=document_path,
+            disposition=disposition,
+        )
+
+        if query.update({CspReportRollup.count: CspReportRollup.count + count},
+                        synchronize_session=False):
+            continue
+
+        try:
+            with session.begin_nested():
+                session.add(CspReportRollup(
+                    hour=hour,
+                    directive=directive,
+                    blocked_origin=blocked_origin,
+                    document_path=document_path,
+                    disposition=disposition,
+                    count=count,
+                ))
+
+        except IntegrityError:
+            query.update({CspReportRollup.count: CspReportRollup.count + count},
+                         synchronize_session=False)
@@ -3,8 +3,10 @@ flask_csp.views.sqlalchemy
 """
 
 import logging
+import time
+from datetime import datetime, timedelta
 
-from flask import abort, request, make_response, render_template, Blueprint
+from flask import abort, current_app, request, make_response, render_template, Blueprint
 
 try:
     from sentry import capture_exception
@@ -12,21 +14,54 @@ try:
 except ImportError:
     SENTRY = False
 
-from ..utils import get_submitted_report
-from .models import CspReport
+from sqlalchemy import and_, case, func, or_  # pylint: disable=import-error
+
+from ..aggregate import utcnow
+from ..metrics import (
+    METRICS, PROMETHEUS_CONTENT_TYPE, REPORTS_RECEIVED, REPORT_WRITE_SECONDS,
+)
+from ..utils import get_submitted_reports, reject_report
+from .models import CspReport, CspReportRollup
+from .rollups import update_rollups
+from .writer import REJECT
 
 
 LOG = logging.getLogger('flask_csp.receiver')
-CSP_BP = Blueprint('csp', __name__)
+# The review and summary templates are shipped in flask_csp/templates
+CSP_BP = Blueprint('csp', __name__, template_folder='../templates')
 
 # This will need to be set by the app's db variable in order to actually work
 DB = None
 
+# Set to a started `ReportWriter` to store reports in batches from a background thread
+WRITER = None
+
+# Set to a started `ReportAggregator` to store repeated reports once, with their count
+AGGREGATOR = None
+
+# Set to True to update the hourly counts of `CspReportRollup` along with the reports
+ROLLUPS = False
+
+# The number of reports listed per page of the review, by default and at most
+REVIEW_PAGE_SIZE = 50
+REVIEW_MAX_PAGE_SIZE = 500
+
+# The review's search parameters, kept in the links to the next pages
+REVIEW_ARGS = ('before', 'after', 'disposition', 'document-uri', 'blocked-uri', 'referrer',
+               'per_page',)
+
+# The columns the summary can group the rollups by, and its other limits
+SUMMARY_GROUPS = ('directive', 'blocked_origin', 'document_path', 'disposition',)
+SUMMARY_HOURS = 24
+SUMMARY_MAX_HOURS = 24 * 31
+SUMMARY_LIMIT = 100
+
 
 @CSP_BP.route('/report', methods=['POST'])
 def receiver():
     """
-    A simple receiver that outputs CSP reports to the log
+    A receiver that stores CSP reports in the database, accepting single
+    `application/csp-report` reports and `application/reports+json` batches
 
     Example CSP report:
 
@@ -44,76 +79,245 @@ def receiver():
 
     """
 
-    csp_report = get_submitted_report()
+    csp_reports = get_submitted_reports()
 
-    # These 2 try blocks are separate to enable returning a 400 or 422 depending on
-    # if the provided data was broken or there was an error saving the report to the db
-    try:
-        report = CspReport(
-            blocked_uri=csp_report['blocked-uri'],
-            disposition=csp_report['disposition'],
-            document_uri=csp_report['document-uri'],
-            effective_directive=csp_report.get('effective-directive'),
-            original_policy=csp_report['original-policy'],
-            referrer=csp_report.get('referrer'),
-            script_sample=csp_report.get('script-sample'),
-            status_code=int(csp_report.get('status-code')),
-            violated_directive=csp_report.get('violated-directive'),
-        )
-
-    except Exception as exc:  # pylint: disable=broad-except
-        if SENTRY:
-            capture_exception(exc)
-
-        LOG.exception(exc)
-        return abort(400)
+    # Broken reports are skipped, returning a 400 when none of the reports could
+    # be used, as opposed to a 422 when there was an error saving them to the db
+    rows = []
+    for csp_report in csp_reports:
+        try:
+            rows.append(get_report_values(csp_report))
 
-    try:
-        with DB.session.begin():
-            DB.session.add(report)
+        except Exception as exc:  # pylint: disable=broad-except
+            if SENTRY:
+                capture_exception(exc)
+
+            LOG.exception(exc)
+
+    if csp_reports and not rows:
+        return reject_report(400)
 
-    except Exception as exc:  # pylint: disable=broad-except
-        if SENTRY:
-            capture_exception(exc)
+    received = store_reports(rows)
 
-        LOG.exception(exc)
-        return abort(422)
+    if METRICS.enabled:
+        REPORTS_RECEIVED.inc('sqlalchemy', amount=received)
 
     return make_response('', 204)
 
 
+def store_reports(rows):
+    """
+    Stores the column values of the received reports with the aggregator, the
+    writer or the db session, whichever is set, returning the number of reports
+    received. Rejects the request when the reports could not be stored.
+    """
+
+    if AGGREGATOR is not None:
+        for values in rows:
+            AGGREGATOR.add(values)
+
+    elif WRITER is not None:
+        # The reports the writer drops are counted by the writer, not as received
+        queued = sum(WRITER.submit(values) for values in rows)
+        if queued < len(rows) and WRITER.drop_policy == REJECT:
+            if METRICS.enabled:
+                REPORTS_RECEIVED.inc('sqlalchemy', amount=queued)
+
+            reject_report(503)
+
+        return queued
+
+    elif rows:
+        start = time.perf_counter()
+        try:
+            with DB.session.begin():
+                DB.session.add_all([CspReport(**values) for values in rows])
+                if ROLLUPS:
+                    update_rollups(DB.session, rows)
+
+        except Exception as exc:  # pylint: disable=broad-except
+            if SENTRY:
+                capture_exception(exc)
+
+            LOG.exception(exc)
+            reject_report(422)
+
+        if METRICS.enabled:
+            REPORT_WRITE_SECONDS.observe(time.perf_counter() - start)
+
+    return len(rows)
+
+
+def get_report_values(csp_report):
+    """Returns the column values of a CspReport for a `csp-report` object"""
+
+    return {
+        'blocked_uri': csp_report['blocked-uri'],
+        'disposition': csp_report['disposition'],
+        'document_uri': csp_report['document-uri'],
+        'effective_directive': csp_report.get('effective-directive'),
+        'original_policy': csp_report['original-policy'],
+        'referrer': csp_report.get('referrer'),
+        'script_sample': csp_report.get('script-sample'),
+        'status_code': int(csp_report.get('status-code')),
+        'violated_directive': csp_report.get('violated-directive'),
+    }
+
+
 @CSP_BP.route('/reports/review', methods=['GET','POST'])
 def review():
     """
-    Lists and allows searching of saved CSP reports
+    Lists and allows searching of saved CSP reports, newest first, one page at a
+    time. The next page starts after the `cursor` of the last listed report, so
+    every page is a range scan of the `ts` index, however deep it is.
     """
 
-    if request.method == 'POST':
-        filters = []
-        for filter_, value in request.values.items():
-            if not value:
-                continue
+    filters = get_review_filters(request.values)
+
+    cursor = request.values.get('cursor')
+    if cursor:
+        ts, report_id = parse_cursor(cursor)
+        filters.append(or_(
+            CspReport.ts < ts,
+            and_(CspReport.ts == ts, CspReport.id < report_id),
+        ))
+
+    per_page = request.values.get('per_page', REVIEW_PAGE_SIZE, type=int)
+    per_page = max(1, min(per_page or REVIEW_PAGE_SIZE, REVIEW_MAX_PAGE_SIZE))
+
+    # One more report than listed tells whether there is a next page
+    reports = (
+        CspReport.query
+        .filter(*filters)
+        .order_by(CspReport.ts.desc(), CspReport.id.desc())
+        .limit(per_page + 1)
+        .all()
+    )
 
-            if filter_ == 'before':
-                filters.append(CspReport.ts.lte(value))
+    next_cursor = None
+    if len(reports) > per_page:
+        reports = reports[:per_page]
+        next_cursor = make_cursor(reports[-1])
 
-            elif filter_ == 'after':
-                filters.append(CspReport.ts.gte(value))
+    # The filters are kept in the links to the next pages
+    args = {
+        key: value for key, value in request.values.items()
+        if value and key in REVIEW_ARGS
+    }
 
-            elif filter_ == 'disposition':
-                filters.append(CspReport.disposition == value)
+    return render_template('reports/list.html', reports=reports, args=args,
+                           next_cursor=next_cursor)
 
-            elif filter_ == 'document-uri':
-                filters.append(CspReport.document_uri.ilike(f'%{value}%'))
 
-            elif filter_ == 'blocked-uri':
-                filters.append(CspReport.blocked_uri.ilike(f'%{value}%'))
+def get_review_filters(values):
+    """Returns the SQLAlchemy filters for the review's search parameters"""
 
-            elif filter_ == 'referrer':
-                filters.append(CspReport.referrer.ilike(f'%{value}%'))
+    filters = []
+    for filter_, value in values.items():
+        if not value:
+            continue
 
-            # else: not a parameter that we care about
+        if filter_ == 'before':
+            filters.append(CspReport.ts <= parse_datetime(value))
+
+        elif filter_ == 'after':
+            filters.append(CspReport.ts >= parse_datetime(value))
+
+        elif filter_ == 'disposition':
+            filters.append(CspReport.disposition == value)
+
+        # Prefix matches can use the indexes of the URI columns
+        elif filter_ == 'document-uri':
+            filters.append(CspReport.document_uri.startswith(value, autoescape=True))
+
+        elif filter_ == 'blocked-uri':
+            filters.append(CspReport.blocked_uri.startswith(value, autoescape=True))
+
+        elif filter_ == 'referrer':
+            filters.append(CspReport.referrer.ilike(f'%{value}%'))
+
+        # else: not a parameter that we care about
+
+    return filters
+
+
+def parse_datetime(value):
+    """Returns the datetime of an ISO 8601 search parameter"""
+
+    try:
+        return datetime.fromisoformat(value)
+
+    except ValueError:
+        return abort(400)
+
+
+def make_cursor(report):
+    """Returns the cursor of the page following a report"""
+
+    return f'{report.ts.isoformat()}_{report.id}'
+
+
+def parse_cursor(cursor):
+    """Returns the `(ts, id)` of a cursor"""
+
+    ts, _, report_id = cursor.rpartition('_')
+    try:
+        return datetime.fromisoformat(ts), int(report_id)
+
+    except ValueError:
+        return abort(400)
+
+
+@CSP_BP.route('/reports/summary', methods=['GET'])
+def summary():
+    """
+    Lists the number of reports over the last `hours` hours and over the last
+    hour, grouped `by` one of the rollup columns. Only the hourly rollups are
+    read, so this costs the same however many reports are stored.
+    """
+
+    group = request.args.get('by', 'blocked_origin')
+    if group not in SUMMARY_GROUPS:
+        return abort(400)
+
+    hours = request.args.get('hours', SUMMARY_HOURS, type=int)
+    hours = max(1, min(hours or SUMMARY_HOURS, SUMMARY_MAX_HOURS))
+
+    current_hour = utcnow().replace(minute=0, second=0, microsecond=0)
+    column = getattr(CspReportRollup, group)
+    # pylint: disable=assignment-from-no-return
+    total = func.sum(CspReportRollup.count)
+    last_hour = func.sum(
+        case((CspReportRollup.hour >= current_hour, CspReportRollup.count), else_=0)
+    )
+    # pylint: enable=assignment-from-no-return
+
+    # Sorting by the last hour shows what spiked
+    order = last_hour if request.args.get('sort') == 'last_hour' else total
+
+    rows = (
+        CspReportRollup.query
+        .with_entities(column.label('value'), total.label('total'), last_hour.label('last_hour'))
+        .filter(CspReportRollup.hour >= current_hour - timedelta(hours=hours - 1))
+        .group_by(column)
+        .order_by(order.desc())
+        .limit(SUMMARY_LIMIT)
+        .all()
+    )
+
+    return render_template('reports/summary.html', rows=rows, group=group, groups=SUMMARY_GROUPS,
+                           hours=hours)
+
+
+@CSP_BP.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Flask-CSP metrics in the Prometheus text format, when metrics are enabled
+    and the route is opted into with the `CSP_METRICS_ROUTE` configuration, as
+    the receiver is usually public
+    """
 
-    reports = CspReport.query.order_by(CspReport.id.desc()).all()
+    if not METRICS.enabled or not current_app.config.get('CSP_METRICS_ROUTE'):
+        return abort(404)
 
-    return render_template('reports/list.html', reports=reports)
+    return make_response(METRICS.render(), 200, {'Content-Type': PROMETHEUS_CONTENT_TYPE})
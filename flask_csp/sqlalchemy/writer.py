@@ -0,0 +1,198 @@
+"""
+flask_csp.sqlalchemy.writer
+~~~~
+Background writer storing the reports of the SQLAlchemy receiver in batches,
+so the receiver can respond without waiting for the database.
+"""
+
+import atexit
+import collections
+import logging
+import threading
+import time
+
+from ..metrics import METRICS, REPORTS_DROPPED, REPORT_WRITE_SECONDS
+
+
+LOG = logging.getLogger('flask_csp.receiver')
+
+# What the writer does with a report when its queue is full
+DROP_NEWEST = 'newest'
+DROP_OLDEST = 'oldest'
+REJECT = 'reject'
+DROP_POLICIES = (DROP_NEWEST, DROP_OLDEST, REJECT)
+
+
+class ReportWriter:  # pylint: disable=too-many-instance-attributes
+    """
+    Queues report rows and inserts them from a background thread, as soon as
+    `batch_size` rows are queued or `flush_interval` seconds after the oldest
+    queued row. At most `max_queued` rows are kept. When the queue is full, the
+    `drop_policy` either drops the new row (`'newest'`), drops the oldest queued
+    row (`'oldest'`), or rejects the report so the receiver responds with a 503
+    (`'reject'`). Queued rows are written when the writer is stopped, which
+    happens at interpreter exit at the latest. With `rollups`, the hourly counts
+    of `CspReportRollup` are updated in the same transaction.
+
+        from flask_csp.sqlalchemy import views
+        from flask_csp.sqlalchemy.models import CspReport
+        from flask_csp.sqlalchemy.writer import ReportWriter
+
+        views.DB = db
+        views.WRITER = ReportWriter(app, db, CspReport).start()
+    """
+
+    # The queue's limits are optional keyword arguments
+    # pylint: disable-next=too-many-arguments
+    def __init__(self, app, db, model, *, batch_size=500, flush_interval=1.0,
+                 max_queued=10000, drop_policy=DROP_NEWEST, rollups=False):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f'drop_policy must be one of {DROP_POLICIES}')
+
+        if max_queued < batch_size:
+            raise ValueError('max_queued cannot be lower than batch_size')
+
+        self.app = app
+        self.db = db
+        self.model = model
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queued = max_queued
+        self.drop_policy = drop_policy
+        self.rollups = rollups
+
+        # Holds `(time queued, row)` pairs, oldest first
+        self._queue = collections.deque()
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._thread = None
+
+    def start(self):
+        """Starts the background thread, returns the writer"""
+
+        with self._condition:
+            if self._thread is not None:
+                return self
+
+            self._stopping = False
+            self._thread = threading.Thread(target=self.run, name='flask-csp-writer', daemon=True)
+            self._thread.start()
+
+        atexit.register(self.stop)
+        return self
+
+    def stop(self, timeout=None):
+        """Writes the queued rows and stops the background thread"""
+
+        with self._condition:
+            thread = self._thread
+            self._stopping = True
+            self._condition.notify()
+
+        if thread is not None:
+            thread.join(timeout)
+        else:
+            # Never started, the rows are written from this thread
+            while self.queued():
+                with self._condition:
+                    rows = self.take_batch()
+                self.write(rows)
+
+        with self._condition:
+            self._thread = None
+
+        atexit.unregister(self.stop)
+
+    def submit(self, row):
+        """
+        Queues a dict of column values, returns False when the row was dropped
+        or rejected because the queue is full
+        """
+
+        with self._condition:
+            if len(self._queue) >= self.max_queued:
+                self.count_dropped(1)
+                if self.drop_policy != DROP_OLDEST:
+                    return False
+
+                self._queue.popleft()
+
+            self._queue.append((time.monotonic(), row))
+            if len(self._queue) >= self.batch_size or len(self._queue) == 1:
+                # Wakes the thread to write the batch, or to wait for the interval
+                self._condition.notify()
+
+        return True
+
+    def queued(self):
+        """Returns the number of queued rows"""
+
+        with self._condition:
+            return len(self._queue)
+
+    def run(self):
+        """Loop of the background thread"""
+
+        while True:
+            with self._condition:
+                timeout = self.get_timeout()
+                while timeout != 0 and not self._stopping:
+                    self._condition.wait(timeout)
+                    timeout = self.get_timeout()
+
+                if self._stopping and not self._queue:
+                    return
+
+                rows = self.take_batch()
+
+            self.write(rows)
+
+    def take_batch(self):
+        """Removes the next batch of rows from the queue. Called with the condition held."""
+
+        count = min(len(self._queue), self.batch_size)
+        return [self._queue.popleft()[1] for _ in range(count)]
+
+    def get_timeout(self):
+        """
+        Returns the seconds until the next batch is due, 0 when it is due now,
+        or None when nothing is queued. Called with the condition held.
+        """
+
+        if not self._queue:
+            return None
+
+        if len(self._queue) >= self.batch_size:
+            return 0
+
+        # The rows left after a batch keep the deadline of the oldest one
+        return max(0, self.flush_interval - (time.monotonic() - self._queue[0][0]))
+
+    def write(self, rows):
+        """Inserts the rows in a single transaction"""
+
+        start = time.perf_counter()
+        try:
+            with self.app.app_context():
+                with self.db.session.begin():
+                    self.db.session.bulk_insert_mappings(self.model, rows)
+                    if self.rollups:
+                        # Imported here so the writer does not need the rollup model
+                        from .rollups import update_rollups  # pylint: disable=import-outside-toplevel
+                        update_rollups(self.db.session, rows)
+
+        except Exception as exc:  # pylint: disable=broad-except
+            LOG.exception(exc)
+            self.count_dropped(len(rows))
+            return
+
+        LOG.debug('Stored %d CSP reports', len(rows))
+        if METRICS.enabled:
+            REPORT_WRITE_SECONDS.observe(time.perf_counter() - start)
+
+    @staticmethod
+    def count_dropped(count):
+        """Counts rows that were accepted but will never be stored"""
+
+        if METRICS.enabled:
+            REPORTS_DROPPED.inc(amount=count)
@@ -2,27 +2,160 @@
 flask_csp.utils
 """
 
-import json
 import logging
+import time
 
-from flask import abort, request
+from flask import abort, current_app, request
+
+from .codec import get_default_codec
+from .metrics import METRICS, REPORTS_REJECTED, REPORT_PARSE_SECONDS
 
 
 LOG = logging.getLogger('flask_csp.receiver')
 
+# Set to a `ReportLimiter` to limit the reports accepted by the receivers
+LIMITER = None
 
-def get_submitted_report():
+# The codec decoding the submitted reports and encoding them for the logs
+CODEC = get_default_codec()
+
+# A single report, as sent for the `report-uri` directive
+CSP_REPORT_CONTENT_TYPE = 'application/csp-report'
+# A batch of reports of the Reporting API, as sent for the `report-to` directive
+REPORTS_CONTENT_TYPE = 'application/reports+json'
+
+# Maps the fields of the body of the Reporting API's `csp-violation` reports to
+# those of the `csp-report` object
+REPORT_BODY_FIELDS = {
+    'blockedURL': 'blocked-uri',
+    'columnNumber': 'column-number',
+    'disposition': 'disposition',
+    'documentURL': 'document-uri',
+    'effectiveDirective': 'effective-directive',
+    'lineNumber': 'line-number',
+    'originalPolicy': 'original-policy',
+    'referrer': 'referrer',
+    'sample': 'script-sample',
+    'sourceFile': 'source-file',
+    'statusCode': 'status-code',
+}
+
+# The default maximum size in bytes of a submitted report or batch of reports,
+# which can be changed with the `CSP_REPORT_MAX_SIZE` app configuration
+REPORT_MAX_SIZE = 64 * 1024
+
+
+def reject_report(status_code):
+    """Aborts the request, counting the rejected report"""
+
+    if METRICS.enabled:
+        REPORTS_REJECTED.inc(str(status_code))
+
+    return abort(status_code)
+
+
+def normalize_report(report):
     """
-    Returns the report that was submitted as part of this request
+    Returns a `csp-violation` report of the Reporting API as a `csp-report`
+    object, or None for other types of reports
     """
 
-    if request.content_type != "application/csp-report":
-        return abort(400)
+    if not isinstance(report, dict) or report.get('type') != 'csp-violation':
+        return None
 
-    csp_report = json.loads(request.data).get('csp-report', {})
-    if not csp_report:
-        return abort(400)
+    body = report.get('body') or {}
+    csp_report = {
+        field: body[key] for key, field in REPORT_BODY_FIELDS.items() if key in body
+    }
 
-    LOG.info(json.dumps(csp_report, indent=4, sort_keys=True))
+    # The Reporting API only sends the effective directive
+    if 'effective-directive' in csp_report:
+        csp_report['violated-directive'] = csp_report['effective-directive']
 
     return csp_report
+
+
+def read_report_body():
+    """
+    Returns the body of the request, rejecting it with a 413 when it is larger
+    than the maximum report size, before reading it if it has a Content-Length
+    """
+
+    max_size = current_app.config.get('CSP_REPORT_MAX_SIZE', REPORT_MAX_SIZE)
+    if not max_size:
+        return request.get_data(cache=False)
+
+    if request.content_length is not None and request.content_length > max_size:
+        return reject_report(413)
+
+    # Reads may return less than asked for, e.g. for chunked bodies
+    chunks = []
+    size = 0
+    while size <= max_size:
+        chunk = request.stream.read(max_size + 1 - size)
+        if not chunk:
+            break
+
+        chunks.append(chunk)
+        size += len(chunk)
+
+    if size > max_size:
+        return reject_report(413)
+
+    return b''.join(chunks)
+
+
+def get_submitted_reports():
+    """
+    Returns the reports that were submitted as part of this request, either a
+    single `application/csp-report` or a batch of `application/reports+json`
+    reports, as a list of `csp-report` objects
+    """
+
+    # Rejected before the body is read
+    if LIMITER is not None and not LIMITER.allow(request.environ):
+        return reject_report(429)
+
+    if request.mimetype not in (CSP_REPORT_CONTENT_TYPE, REPORTS_CONTENT_TYPE):
+        return reject_report(400)
+
+    data = read_report_body()
+    start = time.perf_counter()
+
+    try:
+        if request.mimetype == CSP_REPORT_CONTENT_TYPE:
+            csp_reports = [CODEC.loads(data).get('csp-report', {})]
+            if not csp_reports[0]:
+                return reject_report(400)
+
+        else:
+            csp_reports = []
+            for report in CODEC.loads_array(data):
+                csp_report = normalize_report(report)
+                if csp_report:
+                    csp_reports.append(csp_report)
+
+    except (AttributeError, UnicodeDecodeError, ValueError):
+        return reject_report(400)
+
+    if METRICS.enabled:
+        REPORT_PARSE_SECONDS.observe(time.perf_counter() - start)
+
+    # Encoding the reports is skipped when they would not be logged anyway
+    if LOG.isEnabledFor(logging.INFO):
+        for csp_report in csp_reports:
+            LOG.info(CODEC.dumps(csp_report))
+
+    return csp_reports
+
+
+def get_submitted_report():
+    """
+    Returns the report that was submitted as part of this request
+    """
+
+    csp_reports = get_submitted_reports()
+    if not csp_reports:
+        return reject_report(400)
+
+    return csp_reports[0]
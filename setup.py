@@ -49,6 +49,7 @@ if __name__ == "__main__":
         ],
         extras_requires={
             'tests': [
+                'asgiref',
                 'pytest',
                 'pytest-lazy-fixture',
                 'pytest-cov',
@@ -57,5 +58,8 @@ if __name__ == "__main__":
             'lint': [
                 'pylint',
             ],
+            'orjson': [
+                'orjson',
+            ],
         },
     )
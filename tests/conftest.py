@@ -10,6 +10,20 @@ import pytest  # pylint: disable=import-error
 from flask_csp import CSP, csp
 from flask_csp.constants import FetchRestriction
 
+try:
+    import sqlalchemy  # pylint: disable=import-error
+    from flask_sqlalchemy import SQLAlchemy  # pylint: disable=import-error
+
+except ImportError:
+    DB = None
+
+else:
+    # The models of the SQLAlchemy backend are declared on the app's db, which
+    # they read from the sqlalchemy module
+    DB = sqlalchemy.db = SQLAlchemy()
+
+    from flask_csp.sqlalchemy import views as sqlalchemy_views
+
 
 @pytest.fixture()
 def base_app():
@@ -67,6 +81,28 @@ def receiver_app(base_app):
     yield base_app
 
 
+@pytest.fixture()
+def sqlalchemy_app(base_app, monkeypatch):
+    """
+    Creates a Flask app for the tests with the CSP extension and SQLAlchemy
+    receiver, storing the reports in an in-memory SQLite database
+    """
+
+    if DB is None:
+        pytest.skip('Flask-SQLAlchemy is not installed')
+
+    base_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    DB.init_app(base_app)
+    monkeypatch.setattr(sqlalchemy_views, 'DB', DB)
+
+    CSP(base_app)
+    base_app.register_blueprint(sqlalchemy_views.CSP_BP)
+    with base_app.app_context():
+        DB.create_all()
+
+    yield base_app
+
+
 @pytest.fixture()
 def report_only_app(base_app):
     """
@@ -117,6 +153,54 @@ def full_csp_report(minimal_csp_report):
     return minimal_csp_report
 
 
+@pytest.fixture()
+def batched_reports():
+    """
+    A batch of Reporting API reports, as sent for the report-to directive
+    """
+
+    return [
+        {
+            "type": "csp-violation",
+            "age": 10,
+            "url": "https://example.com/signup.html",
+            "user_agent": "Mozilla/5.0",
+            "body": {
+                "documentURL": "https://example.com/signup.html",
+                "referrer": "",
+                "blockedURL": "https://cdn.example.com/script.js",
+                "effectiveDirective": "script-src-elem",
+                "originalPolicy": "script-src 'self'; report-to csp-endpoint",
+                "sourceFile": "https://example.com/signup.html",
+                "disposition": "enforce",
+                "statusCode": 200,
+                "lineNumber": 12,
+                "columnNumber": 4,
+            },
+        },
+        {
+            "type": "deprecation",
+            "age": 10,
+            "url": "https://example.com/signup.html",
+            "body": {"id": "Feature", "message": "Feature is deprecated"},
+        },
+        {
+            "type": "csp-violation",
+            "age": 12,
+            "url": "https://example.com/",
+            "body": {
+                "documentURL": "https://example.com/",
+                "blockedURL": "inline",
+                "effectiveDirective": "style-src-attr",
+                "originalPolicy": "style-src 'self'; report-to csp-endpoint",
+                "disposition": "report",
+                "statusCode": 200,
+                "sample": "color: red",
+            },
+        },
+    ]
+
+
 @pytest.fixture
 def decorated_app(base_app):
     """
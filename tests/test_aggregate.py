@@ -0,0 +1,60 @@
+"""
+tests.test_aggregate
+"""
+
+from flask_csp.aggregate import ReportAggregator
+
+
+def make_row(blocked_uri, document_uri='https://example.com/'):
+    return {
+        'blocked_uri': blocked_uri,
+        'disposition': 'enforce',
+        'document_uri': document_uri,
+        'violated_directive': 'img-src',
+        'referrer': '',
+    }
+
+
+def test_aggregate_repeats():
+    """Ensure that identical reports are stored once with their count"""
+
+    rows = []
+    aggregator = ReportAggregator(rows.append)
+    for _ in range(3):
+        aggregator.add(make_row('https://a.example.com/'))
+    aggregator.add(make_row('https://b.example.com/'))
+
+    assert len(aggregator) == 2
+    assert aggregator.flush() == 2
+    assert len(aggregator) == 0
+
+    assert [(row['blocked_uri'], row['count']) for row in rows] == [
+        ('https://a.example.com/', 3),
+        ('https://b.example.com/', 1),
+    ]
+    assert rows[0]['ts'] <= rows[0]['last_seen']
+
+
+def test_aggregate_evicts_least_recent():
+    """Ensure that the least recently received report makes room for new ones"""
+
+    rows = []
+    aggregator = ReportAggregator(rows.append, max_entries=2)
+    aggregator.add(make_row('https://a.example.com/'))
+    aggregator.add(make_row('https://b.example.com/'))
+    aggregator.add(make_row('https://a.example.com/'))
+    aggregator.add(make_row('https://c.example.com/'))
+
+    assert [row['blocked_uri'] for row in rows] == ['https://b.example.com/']
+    assert len(aggregator) == 2
+
+
+def test_aggregate_flushes_on_stop():
+    """Ensure that the remaining reports are flushed when the aggregator stops"""
+
+    rows = []
+    aggregator = ReportAggregator(rows.append, flush_interval=60).start()
+    aggregator.add(make_row('https://a.example.com/'))
+    aggregator.stop()
+
+    assert [row['count'] for row in rows] == [1]
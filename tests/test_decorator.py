@@ -49,3 +49,37 @@ def test_decorator_report_only(test_app, csp_state, csp_report_state):
             assert bool(rv.headers.get('Content-Security-Policy-Report-Only')) == csp_report_state
             assert 'default-src' in rv.headers.get('Content-Security-Policy-Report-Only')
             assert 'report-uri' in rv.headers.get('Content-Security-Policy-Report-Only')
+
+
+def test_decorator_config_change(decorated_app):
+    """Ensure that the decorator picks up changes to the CSP_* configuration"""
+
+    with decorated_app.app_context():
+        with decorated_app.test_client() as c:
+            rv = c.get('/decorated')
+            assert rv.headers.get('Content-Security-Policy') == "default-src 'self'"
+
+            rv = c.get('/decorated')
+            assert rv.headers.get('Content-Security-Policy') == "default-src 'self'"
+
+            decorated_app.config['CSP_IMG_SRC'] = 'img.example.com'
+            rv = c.get('/decorated')
+            assert rv.headers.get('Content-Security-Policy') == "default-src 'self'; img-src img.example.com"
+
+
+def test_decorator_async(base_app):
+    """Ensure that the decorator supports async views"""
+
+    pytest.importorskip('asgiref')
+
+    @base_app.route('/decorated/async')
+    @csp(img_src='img.example.com')
+    async def decorated_async():
+        return 'Some async decorated route', 200
+
+    with base_app.app_context():
+        with base_app.test_client() as c:
+            rv = c.get('/decorated/async')
+            assert rv.status_code == 200
+            assert rv.get_data(as_text=True) == 'Some async decorated route'
+            assert rv.headers.get('Content-Security-Policy') == "default-src 'self'; img-src img.example.com"
@@ -4,9 +4,9 @@ tests.test_extension
 
 import pytest
 
-from flask import url_for
+from flask import abort, url_for, Blueprint
 
-from flask_csp import CSP
+from flask_csp import CSP, csp
 
 
 @pytest.mark.parametrize('test_app, state', [
@@ -61,3 +61,178 @@ def test_extension_csp_header(test_app, route, csp_state, csp_report_state):
             assert rv.status_code == 200
             assert rv.headers.get('Content-Security-Policy') == csp_state
             assert rv.headers.get('Content-Security-Policy-Report-Only') == csp_report_state
+
+
+def test_extension_compiled_policy(base_app):
+    """Ensure that static policies are rendered once and dynamic ones on every response"""
+
+    csp = CSP(base_app, report_uri='https://example.com/csp/receiver')
+    assert csp._policy.dynamic == False
+    assert csp._policy.headers == (
+        ('Content-Security-Policy', "default-src 'self'; report-uri https://example.com/csp/receiver"),
+    )
+
+    counter = iter(range(10))
+    dynamic_csp = CSP(base_app, img_src=lambda: f'img{next(counter)}.example.com')
+    assert dynamic_csp._policy.dynamic == True
+    assert dynamic_csp._policy.headers != dynamic_csp._policy.headers
+
+
+def test_endpoint_table(base_app):
+    """Ensure that the endpoint table resolves the policy of every endpoint"""
+
+    bp = Blueprint('table-bp', __name__)
+
+    @bp.route('/bp')
+    def blueprint_view():
+        return 'Blueprint', 200
+
+    CSP().init_blueprint(bp, img_src='img.example.com')
+    base_app.register_blueprint(bp)
+
+    @base_app.route('/decorated')
+    @csp(script_src='scripts.example.com')
+    def decorated():
+        return 'Decorated', 200
+
+    extension = CSP(base_app, endpoint_table=True)
+    assert extension._endpoints is None
+
+    with base_app.test_client() as c:
+        rv = c.get('/undecorated')
+        assert rv.headers.get('Content-Security-Policy') == "default-src 'self'"
+        assert extension._endpoints is not None
+
+        rv = c.get('/bp')
+        assert rv.headers.get('Content-Security-Policy') == "default-src 'self'; img-src img.example.com"
+
+        rv = c.get('/decorated')
+        assert rv.headers.get('Content-Security-Policy') == "default-src 'self'; script-src scripts.example.com"
+
+        rv = c.get('/not-found')
+        assert rv.status_code == 404
+        assert rv.headers.get('Content-Security-Policy') == "default-src 'self'"
+
+    result = base_app.test_cli_runner().invoke(args=['csp', 'endpoints'])
+    assert result.exit_code == 0
+    assert "decorated\tdecorator\tContent-Security-Policy: default-src 'self'; script-src scripts.example.com" in result.output
+    assert "table-bp.blueprint_view\tblueprint:table-bp\tContent-Security-Policy: default-src 'self'; img-src img.example.com" in result.output
+    assert "undecorated\tapp\tContent-Security-Policy: default-src 'self'" in result.output
+
+
+def test_endpoint_table_precedence(base_app):
+    """Ensure that the table applies the policies of the decorator and blueprints"""
+
+    bp = Blueprint('table-bp', __name__)
+
+    @bp.route('/bp')
+    def blueprint_view():
+        return 'Blueprint', 200
+
+    CSP().init_blueprint(bp, img_src='img.example.com')
+    base_app.register_blueprint(bp)
+
+    @base_app.route('/decorated')
+    @csp(script_src='scripts.example.com')
+    def decorated():
+        return 'Decorated', 200
+
+    def login_required(view):
+        # Hides the decorator from the table, without functools.wraps
+        def wrapper(*args, **kwargs):
+            return view(*args, **kwargs)
+        return wrapper
+
+    @base_app.route('/wrapped')
+    @login_required
+    @csp(script_src='scripts.example.com')
+    def wrapped():
+        return 'Wrapped', 200
+
+    extension = CSP(base_app, endpoint_table=True)
+    extension.warm_up(base_app)
+
+    # The table holds the decorator's and the blueprint's own policies
+    assert extension._endpoints['decorated'] is decorated._FLASK_CSP_POLICY.get(base_app)
+    assert extension._endpoints['table-bp.blueprint_view'] is bp._FLASK_CSP_POLICY
+    assert extension._endpoints['wrapper'] is extension._policy
+
+    with base_app.test_client() as c:
+        rv = c.get('/decorated')
+        assert rv.headers.getlist('Content-Security-Policy') == ["default-src 'self'; script-src scripts.example.com"]
+
+        rv = c.get('/bp')
+        assert rv.headers.getlist('Content-Security-Policy') == ["default-src 'self'; img-src img.example.com"]
+
+        # The decorator applies its policy itself when the table does not know it
+        rv = c.get('/wrapped')
+        assert rv.headers.getlist('Content-Security-Policy') == ["default-src 'self'; script-src scripts.example.com"]
+
+
+@pytest.mark.parametrize('reporting_headers, headers', [
+    (None, ['Report-To']),
+    ('Reporting-Endpoints', ['Reporting-Endpoints']),
+    (['Report-To', 'Reporting-Endpoints'], ['Report-To', 'Reporting-Endpoints']),
+])
+def test_extension_reporting_headers(base_app, reporting_headers, headers):
+    """Ensure that the report_to option adds the selected reporting headers"""
+
+    CSP(base_app, report_only=True, reporting_headers=reporting_headers, report_to={
+        'name': 'csp-endpoint',
+        'endpoints': ['https://example.com/csp/receiver'],
+    })
+
+    with base_app.test_client() as c:
+        rv = c.get('/undecorated')
+        assert rv.headers.get('Content-Security-Policy-Report-Only') == (
+            "default-src 'self'; report-to csp-endpoint"
+        )
+
+        expected = {
+            'Report-To': '{"endpoints": [{"url": "https://example.com/csp/receiver"}], '
+                         '"group": "csp-endpoint", "max_age": 3600}',
+            'Reporting-Endpoints': 'csp-endpoint="https://example.com/csp/receiver"',
+        }
+        for header, value in expected.items():
+            assert rv.headers.get(header) == (value if header in headers else None)
+
+
+@pytest.mark.parametrize('route, status_code', [
+    ('/not-found', 404,),
+    ('/forbidden', 403,),
+    ('/broken', 500,),
+])
+def test_extension_error_responses(base_app, route, status_code):
+    """Ensure that error responses get the CSP header exactly once"""
+
+    base_app.config['PROPAGATE_EXCEPTIONS'] = False
+
+    @base_app.route('/forbidden')
+    def forbidden():
+        return abort(403)
+
+    @base_app.route('/broken')
+    def broken():
+        raise RuntimeError('Broken view')
+
+    CSP(base_app, intercept_exceptions=True)
+
+    with base_app.test_client() as c:
+        rv = c.get(route)
+        assert rv.status_code == status_code
+        assert rv.headers.getlist('Content-Security-Policy') == ["default-src 'self'"]
+
+
+def test_extension_minify(base_app, caplog):
+    """Ensure that the minify option shrinks the header and the budget is checked"""
+
+    with caplog.at_level('INFO', logger='flask_csp.core'):
+        CSP(base_app, minify=True, header_budget=40,
+            img_src=['self', 'https:', 'https://img.example.com'], style_src='self')
+
+    assert 'Minified the Content-Security-Policy header from 83 to 41 bytes' in caplog.text
+    assert 'The Content-Security-Policy header is 68 bytes, exceeding the budget of 40 bytes' in caplog.text
+
+    with base_app.test_client() as c:
+        rv = c.get('/undecorated')
+        assert rv.headers.get('Content-Security-Policy') == "default-src 'self'; img-src 'self' https:"
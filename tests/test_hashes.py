@@ -0,0 +1,83 @@
+"""
+tests.test_hashes
+"""
+
+import os
+
+import pytest
+
+from flask import Flask
+
+from flask_csp import CSP
+from flask_csp.hashes import collect_inline_hashes, extract_inline_hashes, hash_source
+
+
+TEMPLATE = '''<html>
+    <head>
+        <style>body { color: red; }</style>
+        <script src="/static/app.js"></script>
+        <script>console.log("static");</script>
+        <script>console.log("{{ dynamic }}");</script>
+    </head>
+</html>
+'''
+
+
+@pytest.fixture()
+def template_app(tmp_path):
+    """A Flask app with a template containing inline blocks"""
+
+    (tmp_path / 'index.html').write_text(TEMPLATE)
+    app = Flask('testing', template_folder=str(tmp_path))
+
+    @app.route('/')
+    def index():
+        return 'Index', 200
+
+    yield app
+
+
+def test_extract_inline_hashes():
+    """Ensure that only static inline blocks are hashed"""
+
+    assert extract_inline_hashes(TEMPLATE) == {
+        'script_src': [hash_source('console.log("static");')],
+        'style_src': [hash_source('body { color: red; }')],
+    }
+    assert hash_source('') == "'sha256-47DEQpj8HBSa+/TImW+5JCeuQeRkm5NMpJWZG3hSuFU='"
+
+
+def test_hash_cache(template_app, tmp_path):
+    """Ensure that the hash cache is used for unchanged templates"""
+
+    cache_path = str(tmp_path / 'cache.json')
+    hashes = collect_inline_hashes(template_app, cache_path=cache_path)
+    assert os.path.exists(cache_path)
+
+    # An unchanged modification time means that the template is not read again
+    template_path = str(tmp_path / 'index.html')
+    mtime = os.stat(template_path).st_mtime
+    with open(template_path, 'w') as template:
+        template.write('<script>changed()</script>')
+    os.utime(template_path, (mtime, mtime))
+    assert collect_inline_hashes(template_app, cache_path=cache_path) == hashes
+
+    os.utime(template_path, (mtime + 10, mtime + 10))
+    assert collect_inline_hashes(template_app, cache_path=cache_path) == {
+        'script_src': [hash_source('changed()')],
+        'style_src': [],
+    }
+
+
+def test_extension_hash_inline(template_app):
+    """Ensure that the extension adds the hashes to the header"""
+
+    CSP(template_app, hash_inline=True)
+    script_hash = hash_source('console.log("static");')
+    style_hash = hash_source('body { color: red; }')
+
+    with template_app.test_client() as c:
+        rv = c.get('/')
+        assert rv.headers.get('Content-Security-Policy') == (
+            f"default-src 'self'; script-src 'self' {script_hash}; style-src 'self' {style_hash}"
+        )
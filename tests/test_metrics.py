@@ -0,0 +1,93 @@
+"""
+tests.test_metrics
+"""
+
+import pytest
+
+from flask import url_for
+
+from flask_csp import CSP
+from flask_csp.metrics import METRICS, Counter, Histogram
+
+
+@pytest.fixture()
+def metrics():
+    """Enables the metrics for a test"""
+
+    METRICS.clear()
+    METRICS.enable()
+    yield METRICS
+    METRICS.enable(False)
+    METRICS.clear()
+
+
+def test_histogram():
+    """Ensure that histograms count values into the right buckets"""
+
+    histogram = Histogram('test_seconds', 'Test histogram.', labels=('endpoint',), buckets=(1, 5))
+    for value in (0.5, 1, 3, 10):
+        histogram.observe(value, 'index')
+
+    assert histogram.snapshot() == {
+        ('index',): {'count': 4, 'sum': 14.5, 'buckets': {1: 2, 5: 1, float('inf'): 1}},
+    }
+    assert histogram.render().splitlines() == [
+        '# HELP test_seconds Test histogram.',
+        '# TYPE test_seconds histogram',
+        'test_seconds_bucket{endpoint="index",le="1"} 2',
+        'test_seconds_bucket{endpoint="index",le="5"} 3',
+        'test_seconds_bucket{endpoint="index",le="+Inf"} 4',
+        'test_seconds_sum{endpoint="index"} 14.5',
+        'test_seconds_count{endpoint="index"} 4',
+    ]
+
+
+def test_counter():
+    """Ensure that counters are kept per label value"""
+
+    counter = Counter('test_total', 'Test counter.', labels=('status',))
+    counter.inc('400')
+    counter.inc('400')
+    counter.inc('422')
+
+    assert counter.snapshot() == {('400',): 2, ('422',): 1}
+
+
+def test_receiver_metrics(base_app, metrics, minimal_csp_report):
+    """Ensure that headers and reports are measured and exposed by the receiver"""
+
+    CSP(base_app, receiver_prefix='/csp')
+
+    with base_app.app_context():
+        with base_app.test_client() as c:
+            c.get('/undecorated')
+            c.post(url_for('csp.receiver'), json=minimal_csp_report,
+                   headers={'Content-Type': 'application/csp-report'})
+            c.post(url_for('csp.receiver'), json=minimal_csp_report)
+
+            snapshot = metrics.snapshot()
+            assert snapshot['flask_csp_header_build_seconds'][()]['count'] == 1
+            assert snapshot['flask_csp_header_bytes'][('undecorated',)]['sum'] == len(
+                "Content-Security-Policy: default-src 'self'\r\n")
+            assert snapshot['flask_csp_reports_received_total'] == {('simple',): 1}
+            assert snapshot['flask_csp_reports_rejected_total'] == {('400',): 1}
+
+            # The route is opt-in, the receiver being public
+            rv = c.get(url_for('csp.metrics'))
+            assert rv.status_code == 404
+
+            base_app.config['CSP_METRICS_ROUTE'] = True
+            rv = c.get(url_for('csp.metrics'))
+            assert rv.status_code == 200
+            assert 'flask_csp_reports_received_total{backend="simple"} 1' in rv.get_data(as_text=True)
+
+
+def test_metrics_disabled(receiver_app):
+    """Ensure that the metrics route is not available when metrics are disabled"""
+
+    receiver_app.config['CSP_METRICS_ROUTE'] = True
+
+    with receiver_app.app_context():
+        with receiver_app.test_client() as c:
+            rv = c.get(url_for('csp.metrics'))
+            assert rv.status_code == 404
@@ -0,0 +1,119 @@
+"""
+tests.test_middleware
+"""
+
+import re
+
+import pytest
+
+from flask import abort, render_template_string, request
+
+from flask_csp import CSPMiddleware, csp
+from flask_csp.hashes import hash_source
+from flask_csp.metrics import METRICS
+from flask_csp.middleware import POLICY_ENVIRON_KEY
+
+
+@pytest.fixture()
+def middleware_app(base_app):
+    """A Flask app wrapped by the CSP middleware"""
+
+    base_app.config['PROPAGATE_EXCEPTIONS'] = False
+
+    @base_app.route('/error')
+    def error():
+        raise RuntimeError('Broken view')
+
+    @base_app.route('/forbidden')
+    def forbidden():
+        return abort(403)
+
+    @base_app.route('/decorated')
+    @csp(img_src='img.example.com')
+    def decorated():
+        return 'Decorated', 200
+
+    @base_app.route('/override')
+    def override():
+        request.environ[POLICY_ENVIRON_KEY] = (('Content-Security-Policy', "default-src 'none'"),)
+        return 'Override', 200
+
+    @base_app.route('/disabled')
+    def disabled():
+        request.environ[POLICY_ENVIRON_KEY] = False
+        return 'Disabled', 200
+
+    CSPMiddleware(base_app, report_uri='https://example.com/csp/receiver')
+    yield base_app
+
+
+@pytest.mark.parametrize('route, status_code, csp_header', [
+    ('/undecorated', 200, "default-src 'self'; report-uri https://example.com/csp/receiver",),
+    ('/not-found', 404, "default-src 'self'; report-uri https://example.com/csp/receiver",),
+    ('/error', 500, "default-src 'self'; report-uri https://example.com/csp/receiver",),
+    ('/forbidden', 403, "default-src 'self'; report-uri https://example.com/csp/receiver",),
+    ('/decorated', 200, "default-src 'self'; img-src img.example.com",),
+    ('/override', 200, "default-src 'none'",),
+    ('/disabled', 200, None,),
+])
+def test_middleware(middleware_app, route, status_code, csp_header):
+    """Ensure that the middleware adds the CSP header to every response"""
+
+    with middleware_app.test_client() as c:
+        rv = c.get(route)
+        assert rv.status_code == status_code
+        assert rv.headers.get('Content-Security-Policy') == csp_header
+        assert len(rv.headers.getlist('Content-Security-Policy')) == (1 if csp_header else 0)
+
+
+def test_middleware_nonce(base_app):
+    """Ensure that the middleware uses the nonce of the request"""
+
+    @base_app.route('/nonce')
+    def nonce():
+        return render_template_string('<script nonce="{{ csp_nonce() }}"></script>')
+
+    CSPMiddleware(base_app, nonce=True)
+
+    with base_app.test_client() as c:
+        rv = c.get('/nonce')
+        nonce = re.search('nonce="([^"]+)"', rv.get_data(as_text=True)).group(1)
+        assert f"'nonce-{nonce}'" in rv.headers.get('Content-Security-Policy')
+
+        rv = c.get('/undecorated')
+        assert "'nonce-" in rv.headers.get('Content-Security-Policy')
+
+
+def test_middleware_hashes_and_metrics(base_app, tmp_path):
+    """Ensure that the middleware allows inline blocks by their hashes and records metrics"""
+
+    (tmp_path / 'index.html').write_text('<script>console.log(1);</script>')
+    base_app.template_folder = str(tmp_path)
+
+    METRICS.clear()
+    try:
+        CSPMiddleware(base_app, hash_inline=True, metrics=True)
+        assert METRICS.enabled
+
+        with base_app.test_client() as c:
+            rv = c.get('/undecorated')
+
+        header = f"default-src 'self'; script-src 'self' {hash_source('console.log(1);')}"
+        assert rv.headers.get('Content-Security-Policy') == header
+        assert METRICS.snapshot()['flask_csp_header_bytes'][('undecorated',)]['sum'] == len(
+            f'Content-Security-Policy: {header}\r\n')
+
+    finally:
+        METRICS.enable(False)
+        METRICS.clear()
+
+
+@pytest.mark.parametrize('option', ['endpoint_table', 'intercept_exceptions'])
+def test_middleware_unsupported_options(base_app, option):
+    """Ensure that the options of the after request handler are rejected"""
+
+    wsgi_app = base_app.wsgi_app
+    with pytest.raises(TypeError):
+        CSPMiddleware(base_app, **{option: True})
+
+    assert base_app.wsgi_app == wsgi_app
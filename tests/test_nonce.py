@@ -0,0 +1,128 @@
+"""
+tests.test_nonce
+"""
+
+import re
+
+import pytest
+
+from flask import render_template_string
+
+from flask_csp import CSP, csp
+from flask_csp.constants import FetchRestriction
+from flask_csp.nonce import NoncePool
+
+
+def test_nonce_pool():
+    """Ensure that the nonce pool hands out unique nonces across refills"""
+
+    pool = NoncePool(batch_size=4)
+    nonces = [pool.get() for _ in range(20)]
+
+    assert len(set(nonces)) == 20
+    assert all(len(nonce) == 24 for nonce in nonces)
+
+
+@pytest.mark.parametrize('options, csp_header', [
+    (
+        {'nonce': True},
+        "default-src 'self'; script-src 'self' 'nonce-{nonce}'; style-src 'self' 'nonce-{nonce}'",
+    ),
+    (
+        {'nonce': ['script-src'], 'default_src': FetchRestriction.NONE, 'script_src': '*.example.com'},
+        "default-src 'none'; script-src *.example.com 'nonce-{nonce}'",
+    ),
+])
+def test_extension_nonce(base_app, options, csp_header):
+    """Ensure that the nonce is added to the header and available in templates"""
+
+    CSP(base_app, **options)
+
+    @base_app.route('/nonce')
+    def nonce():
+        return render_template_string('<script nonce="{{ csp_nonce() }}"></script>')
+
+    with base_app.app_context():
+        with base_app.test_client() as c:
+            seen = set()
+            for _ in range(3):
+                rv = c.get('/nonce')
+                nonce = re.search('nonce="([^"]+)"', rv.get_data(as_text=True)).group(1)
+                assert rv.headers.get('Content-Security-Policy') == csp_header.format(nonce=nonce)
+                seen.add(nonce)
+
+            assert len(seen) == 3
+
+
+def test_decorator_nonce(base_app):
+    """Ensure that the decorator supports nonces"""
+
+    @base_app.route('/decorated/nonce')
+    @csp(nonce=True)
+    def decorated_nonce():
+        return render_template_string('<style nonce="{{ csp_nonce() }}"></style>')
+
+    with base_app.app_context():
+        with base_app.test_client() as c:
+            rv = c.get('/decorated/nonce')
+            nonce = re.search('nonce="([^"]+)"', rv.get_data(as_text=True)).group(1)
+            assert f"'nonce-{nonce}'" in rv.headers.get('Content-Security-Policy')
+
+
+def test_split_nonce_header(base_app):
+    """Ensure that the nonce is sent in a second, minimal header when requested"""
+
+    CSP(base_app, nonce=True, split_nonce_header=True, img_src='*',
+        script_src=['self', 'strict-dynamic'], report_uri='/report')
+
+    @base_app.route('/nonce')
+    def nonce():
+        return render_template_string('<script nonce="{{ csp_nonce() }}"></script>')
+
+    with base_app.app_context():
+        with base_app.test_client() as c:
+            static_headers = set()
+            for _ in range(3):
+                rv = c.get('/nonce')
+                nonce = re.search('nonce="([^"]+)"', rv.get_data(as_text=True)).group(1)
+                static_header, nonce_header = rv.headers.getlist('Content-Security-Policy')
+                assert nonce not in static_header
+                assert nonce_header == (
+                    f"script-src 'self' 'strict-dynamic' 'nonce-{nonce}'; "
+                    f"style-src 'self' 'nonce-{nonce}'; report-uri /report"
+                )
+                static_headers.add(static_header)
+
+            assert static_headers == {
+                "default-src 'self'; img-src *; script-src * data: blob: 'self' 'unsafe-inline'; "
+                "style-src 'self' 'unsafe-inline'; report-uri /report"
+            }
+
+
+@pytest.mark.parametrize('options, nonce_header', [
+    (
+        # Images would fall back to the nonce default-src of the second header
+        {'nonce': ['default-src'], 'img_src': 'img.example.com'},
+        "default-src 'self' 'nonce-{nonce}'; img-src img.example.com",
+    ),
+    (
+        # Workers would fall back to the nonce script-src of the second header
+        {'nonce': ['script-src'], 'child_src': 'blob:', 'script_src': 'self'},
+        "child-src blob:; script-src 'self' 'nonce-{nonce}'",
+    ),
+])
+def test_split_nonce_header_fallbacks(base_app, options, nonce_header):
+    """Ensure that fetches falling back to a nonce directive are checked as with one header"""
+
+    CSP(base_app, split_nonce_header=True, **options)
+
+    @base_app.route('/nonce')
+    def nonce():
+        return render_template_string('<script nonce="{{ csp_nonce() }}"></script>')
+
+    with base_app.app_context():
+        with base_app.test_client() as c:
+            rv = c.get('/nonce')
+            nonce = re.search('nonce="([^"]+)"', rv.get_data(as_text=True)).group(1)
+            assert rv.headers.getlist('Content-Security-Policy')[1] == \
+                nonce_header.format(nonce=nonce)
@@ -0,0 +1,44 @@
+"""
+tests.test_periodic
+"""
+
+import threading
+import time
+
+from flask_csp.periodic import PeriodicThread
+
+
+def test_periodic_calls():
+    """Ensure that the function keeps being called after an error, until stopped"""
+
+    calls = []
+    called = threading.Event()
+
+    def func():
+        calls.append(len(calls))
+        if len(calls) == 3:
+            called.set()
+        if len(calls) == 1:
+            raise ValueError('Broken')
+
+    stops = []
+    thread = PeriodicThread(func, 0.001, name='flask-csp-test', on_stop=lambda: stops.append(1))
+    thread.start()
+    assert called.wait(5)
+    thread.stop()
+
+    count = len(calls)
+    assert count >= 3
+    assert stops == [1]
+
+    # No call is made once stopped
+    time.sleep(0.01)
+    assert len(calls) == count
+
+
+def test_periodic_stop_unstarted():
+    """Ensure that on_stop is called even when the thread never started"""
+
+    stops = []
+    PeriodicThread(None, 60, name='flask-csp-test', on_stop=lambda: stops.append(1)).stop()
+    assert stops == [1]
@@ -6,6 +6,7 @@ import pytest
 
 from flask import url_for
 
+from flask_csp import CSP
 from flask_csp.constants import (
     Directive, FetchRestriction, SandboxRestriction, TrustedTypesRestriction
 )
@@ -17,10 +18,19 @@ from flask_csp.policy import (
     SandboxDirective,
     TrustedTypesDirective,
     Header,
+    CUSTOM_DIRECTIVES,
+    DIRECTIVE_CLASSES,
+    register_directive_class,
     ReportGroup,
     ReportTo,
+    ReportingEndpoints,
     ContentSecurityPolicy,
     ReportOnlyPolicy,
+    FrozenDirective,
+    FrozenPolicy,
+    parse_directives,
+    parse_options,
+    parse_policy,
 )
 
 
@@ -57,6 +67,18 @@ def test_allowed_items():
         is_allowed_trustedtype_restriction('non-existent')
 
 
+def test_freeform_restrictions():
+    """Ensure that restrictions which are not reserved words are kept as strings"""
+
+    directive = SourceDirective(Directive.SCRIPT_SRC, 'self', 'https:', '*.example.com', "'nonce-abc'")
+    assert directive.restrictions == [
+        FetchRestriction.SELF, FetchRestriction.HTTPS, '*.example.com', "'nonce-abc'",
+    ]
+
+    directive = TrustedTypesDirective('allow-duplicates', 'my-policy')
+    assert directive.restrictions == [TrustedTypesRestriction.ALLOW_DUPLICATES, 'my-policy']
+
+
 @pytest.mark.parametrize('directive, result', [
     (Directive.STYLE_SRC, SourceDirective,),
     (Directive.SCRIPT_SRC, SourceDirective,),
@@ -72,6 +94,58 @@ def test_load_directive(directive, result):
     assert isinstance(policy_directive, result)
 
 
+def test_register_directive_class():
+    """Ensure that load directive uses the registered directive classes"""
+
+    assert set(DIRECTIVE_CLASSES) == set(Directive)
+
+    class RequireSriForDirective(SourceDirective):
+        _allowed = frozenset([Directive.REQUIRE_SRI_FOR])
+
+    register_directive_class(RequireSriForDirective)
+    try:
+        policy_directive = load_directive('require-sri-for', 'script')
+        assert isinstance(policy_directive, RequireSriForDirective)
+        assert str(policy_directive) == 'require-sri-for script'
+
+    finally:
+        register_directive_class(SourceDirective, directives=[Directive.REQUIRE_SRI_FOR])
+
+    assert type(load_directive('require-sri-for', 'script')) is SourceDirective
+
+    with pytest.raises(ValueError):
+        register_directive_class(RequireSriForDirective, directives=[Directive.SCRIPT_SRC])
+
+
+def test_register_custom_directive(base_app):
+    """Ensure that directives missing from the Directive enum can be registered by name"""
+
+    with pytest.raises(ValueError):
+        load_directive('fenced-frame-src', 'self')
+
+    register_directive_class(SourceDirective, directives=['fenced-frame-src'])
+    try:
+        policy_directive = load_directive('fenced_frame_src', 'self', 'https://frames.example.com')
+        assert isinstance(policy_directive, SourceDirective)
+        assert policy_directive.directive.value == 'fenced-frame-src'
+        assert str(policy_directive) == "fenced-frame-src 'self' https://frames.example.com"
+
+        assert parse_directives("fenced-frame-src https:; img-src *")[0] == FrozenDirective(
+            policy_directive.directive, 'https:')
+
+        CSP(base_app, fenced_frame_src=['self'])
+        with base_app.test_client() as c:
+            rv = c.get('/undecorated')
+            assert rv.headers.get('Content-Security-Policy') == "default-src 'self'; fenced-frame-src 'self'"
+
+    finally:
+        DIRECTIVE_CLASSES.pop(CUSTOM_DIRECTIVES.pop('FENCED_FRAME_SRC'))
+        parse_directives.cache_clear()
+
+    with pytest.raises(ValueError):
+        register_directive_class(SourceDirective, directives=['fenced frame'])
+
+
 @pytest.mark.parametrize('directive', [
     'non-extistent',
     'ugrade-insecure-requests',
@@ -121,6 +195,25 @@ def test_report_to(groups, result):
     assert str(report_to) == f'Report-To: {result}'
 
 
+def test_reporting_endpoints():
+    """Ensure Reporting-Endpoints outputs correctly"""
+
+    reporting_endpoints = ReportingEndpoints(
+        ReportGroup('default', ['https://example.com/csp/receiver', 'https://example.com/other']),
+        ReportGroup('other', 'https://example.com/csp/other-receiver'),
+    )
+
+    assert str(reporting_endpoints) == (
+        'Reporting-Endpoints: default="https://example.com/csp/receiver", '
+        'other="https://example.com/csp/other-receiver"'
+    )
+
+    frozen = reporting_endpoints.freeze()
+    assert frozen.key == 'Reporting-Endpoints'
+    assert frozen.value == reporting_endpoints.value
+    assert str(frozen) == str(reporting_endpoints)
+
+
 @pytest.mark.parametrize('csp_directives, result', [
     (
         EmptyDirective(Directive.UPGRADE_INSECURE_REQUESTS),
@@ -189,3 +282,251 @@ def test_report_only_csp_fail():
 
     with pytest.raises(ValueError):
         csp.value
+
+
+def test_frozen_policy():
+    """Ensure that frozen policies render like their mutable counterparts and are hashable"""
+
+    csp = ContentSecurityPolicy([
+        EmptyDirective(Directive.UPGRADE_INSECURE_REQUESTS),
+        SourceDirective(Directive.DEFAULT_SRC, FetchRestriction.SELF, 'example.com'),
+        SimpleDirective(Directive.REPORT_URI, 'https://example.com/csp/receiver'),
+    ])
+    frozen = csp.freeze()
+
+    assert str(frozen) == str(csp)
+    assert frozen == csp.freeze()
+    assert {frozen: True}[csp.freeze()]
+
+    with pytest.raises(AttributeError):
+        frozen.value = ''
+    with pytest.raises(AttributeError):
+        frozen.directives[1].restrictions = ()
+
+    # Restrictions are deduplicated and interned
+    directive = FrozenDirective(Directive.IMG_SRC, 'example.com', FetchRestriction.SELF, "'self'")
+    assert str(directive) == "img-src example.com 'self'"
+    assert directive.restrictions[0] is frozen.directives[1].restrictions[1]
+
+    with pytest.raises(ValueError):
+        SourceDirective(Directive.IMG_SRC, lambda: 'example.com').freeze()
+    with pytest.raises(ValueError):
+        ReportOnlyPolicy(SourceDirective(Directive.DEFAULT_SRC, FetchRestriction.SELF)).freeze()
+
+
+def test_frozen_report_to():
+    """Ensure that frozen Report-To headers render like their mutable counterparts"""
+
+    report_to = ReportTo(
+        ReportGroup('default', 'https://example.com/csp/receiver'),
+        ReportGroup('other', ['https://example.com/a', 'https://example.com/b'], max_age=60),
+    )
+
+    assert str(report_to.freeze()) == str(report_to)
+    assert hash(report_to.freeze()) == hash(report_to.freeze())
+
+
+@pytest.mark.parametrize('csp_directives, result', [
+    (
+        [SourceDirective(Directive.DEFAULT_SRC, FetchRestriction.SELF, 'example.com', "'self'", 'example.com')],
+        "default-src 'self' example.com",
+    ),
+    (
+        [SourceDirective(Directive.IMG_SRC, '*.example.com', 'img.example.com', 'a.b.example.com/path',
+                         'example.com', 'https://img.example.com', 'img.example.com:8080')],
+        'img-src *.example.com example.com https://img.example.com img.example.com:8080',
+    ),
+    (
+        [SourceDirective(Directive.IMG_SRC, 'https:', 'https://img.example.com', 'http://img.example.com',
+                         'img.example.com', FetchRestriction.DATA)],
+        'img-src https: http://img.example.com img.example.com data:',
+    ),
+    (
+        [SourceDirective(Directive.IMG_SRC, 'img.example.com', '*', 'wss://socket.example.com', 'blob:')],
+        'img-src * blob:',
+    ),
+    (
+        [SourceDirective(Directive.IMG_SRC, 'EXAMPLE.com', 'example.com')],
+        'img-src EXAMPLE.com',
+    ),
+    (
+        [
+            SourceDirective(Directive.DEFAULT_SRC, FetchRestriction.SELF, 'cdn.example.com'),
+            SourceDirective(Directive.SCRIPT_SRC, 'cdn.example.com', FetchRestriction.SELF),
+            SourceDirective(Directive.STYLE_SRC, FetchRestriction.SELF),
+            SimpleDirective(Directive.REPORT_URI, 'https://example.com/csp/receiver'),
+        ],
+        "default-src 'self' cdn.example.com; style-src 'self'; report-uri https://example.com/csp/receiver",
+    ),
+    (
+        # worker-src would fall back to child-src instead of default-src
+        [
+            SourceDirective(Directive.DEFAULT_SRC, FetchRestriction.SELF),
+            SourceDirective(Directive.CHILD_SRC, 'blob:'),
+            SourceDirective(Directive.WORKER_SRC, FetchRestriction.SELF),
+        ],
+        "default-src 'self'; child-src blob:; worker-src 'self'",
+    ),
+    (
+        # Unset frame-src and worker-src fall back through child-src to default-src
+        [
+            SourceDirective(Directive.DEFAULT_SRC, FetchRestriction.SELF),
+            SourceDirective(Directive.CHILD_SRC, FetchRestriction.SELF),
+            SourceDirective(Directive.IMG_SRC, 'img.example.com'),
+        ],
+        "default-src 'self'; img-src img.example.com",
+    ),
+    (
+        # Unset worker-src would fall back to script-src instead of default-src
+        [
+            SourceDirective(Directive.DEFAULT_SRC, FetchRestriction.SELF),
+            SourceDirective(Directive.CHILD_SRC, FetchRestriction.SELF),
+            SourceDirective(Directive.SCRIPT_SRC, 'cdn.example.com'),
+            SourceDirective(Directive.FRAME_SRC, FetchRestriction.NONE),
+        ],
+        "default-src 'self'; child-src 'self'; script-src cdn.example.com; frame-src 'none'",
+    ),
+    (
+        # A wildcard with a scheme only covers the hosts of that scheme, on the default port
+        [
+            SourceDirective(Directive.IMG_SRC, 'https://*', 'http://example.com', 'ws://a.com',
+                            'https://b.com', 'https://c.com:8443'),
+        ],
+        "img-src https://* http://example.com ws://a.com https://c.com:8443",
+    ),
+    (
+        [
+            SourceDirective(Directive.CONNECT_SRC, 'http://*', 'wss://a.com', 'http://*.example.com',
+                            'example.com'),
+        ],
+        "connect-src http://* wss://a.com example.com",
+    ),
+    (
+        [
+            SourceDirective(Directive.IMG_SRC, '*', 'https://*', 'wss://a.com', 'ftp://b.com'),
+        ],
+        "img-src * ftp://b.com",
+    ),
+])
+def test_minify(csp_directives, result):
+    """Ensure that minifying a policy keeps the same allowed sources"""
+
+    csp = ContentSecurityPolicy(csp_directives)
+
+    assert csp.minify().value == result
+
+
+@pytest.mark.parametrize('value, result', [
+    ("default-src 'self'; img-src *", "default-src 'self'; img-src *"),
+    # Whitespace, case and empty directives
+    ("  Default-Src\t'SELF' ;; IMG-SRC  *  ;", "default-src 'self'; img-src *"),
+    # Only the first of repeated directives is enforced
+    ("script-src 'self'; script-src *", "script-src 'self'"),
+    # Unknown directives are dropped
+    ("default-src 'none'; block-everything yes", "default-src 'none'"),
+    (
+        "upgrade-insecure-requests; sandbox allow-scripts; report-uri /report",
+        "upgrade-insecure-requests; sandbox allow-scripts; report-uri /report",
+    ),
+])
+def test_parse_policy(value, result):
+    """Ensure that serialized policies are parsed into equivalent policies"""
+
+    policy = parse_policy(value)
+
+    assert isinstance(policy, FrozenPolicy)
+    assert policy.value == result
+    assert parse_policy(value) is policy
+    assert ContentSecurityPolicy.parse(value).value == result
+
+
+@pytest.mark.parametrize('value, result', [
+    # Browsers read unquoted keywords as hosts and schemes without a colon as hosts
+    ("script-src self none unsafe-inline", "script-src self none unsafe-inline"),
+    ("img-src data https", "img-src data https"),
+    ("script-src 'SELF' DATA: 'unsafe-inline'", "script-src 'self' data: 'unsafe-inline'"),
+])
+def test_parse_policy_keywords(value, result):
+    """Ensure that only quoted keywords and schemes with a colon are read as such"""
+
+    assert parse_policy(value).value == result
+    assert ContentSecurityPolicy.parse(value).value == result
+
+
+@pytest.mark.parametrize('value, result', [
+    # Every URI of report-uri is reported to
+    ("default-src 'self'; report-uri /a /b", "default-src 'self'; report-uri /a /b"),
+    # Browsers ignore unknown sandbox flags, but still apply the sandbox
+    ("sandbox allow-bogus", "sandbox"),
+    ("sandbox Allow-Forms allow-bogus allow-scripts", "sandbox allow-forms allow-scripts"),
+])
+def test_parse_policy_enforced(value, result):
+    """Ensure that directives are kept as browsers enforce them"""
+
+    assert parse_policy(value).value == result
+    assert parse_policy(value, strict=True).value == result
+
+
+def test_parse_policy_report_uris():
+    """Ensure that report-only policies with several report URIs are parsed"""
+
+    policy = parse_policy("default-src 'self'; report-uri /a /b", report_only=True)
+    assert policy.key == 'Content-Security-Policy-Report-Only'
+    assert policy.directives[1].restrictions == ('/a', '/b')
+
+    assert parse_options("report-uri /a /b") == {'report_uri': ['/a', '/b']}
+    assert str(load_directive('report_uri', '/a', '/b')) == 'report-uri /a /b'
+
+    with pytest.raises(ValueError):
+        load_directive('report_to', 'a', 'b')
+
+    with pytest.raises(ValueError):
+        parse_options("sandbox allow-bogus")
+
+
+def test_parse_policy_bare_self():
+    """Ensure that `self` stays a host rather than becoming `'self'`"""
+
+    assert parse_directives("script-src self")[0].restrictions == ('self',)
+    assert ContentSecurityPolicy.parse("script-src self").directives[0].restrictions == ['self']
+
+
+def test_parse_options_bare_keywords():
+    """Ensure that hosts which the options would read as keywords are rejected"""
+
+    with pytest.raises(ValueError):
+        parse_options("script-src self")
+
+
+def test_parse_policy_strict():
+    """Ensure that strict parsing rejects unknown and invalid directives"""
+
+    with pytest.raises(ValueError):
+        parse_directives("default-src 'none'; block-everything yes", strict=True)
+
+    with pytest.raises(ValueError):
+        parse_policy("report-to a b", strict=True)
+
+    with pytest.raises(ValueError):
+        parse_policy("default-src 'none'", report_only=True)
+
+
+def test_parse_options(base_app):
+    """Ensure that policies can be configured as strings"""
+
+    options = parse_options("script-src 'self' cdn.example.com; object-src; upgrade-insecure-requests")
+    assert options == {
+        'script_src': ["'self'", 'cdn.example.com'],
+        'object_src': ["'none'"],
+        'upgrade_insecure_requests': True,
+    }
+
+    CSP(base_app, **options)
+
+    with base_app.test_client() as c:
+        rv = c.get('/undecorated')
+
+    assert rv.headers.get('Content-Security-Policy') == (
+        "default-src 'self'; object-src 'none'; script-src 'self' cdn.example.com; "
+        "upgrade-insecure-requests"
+    )
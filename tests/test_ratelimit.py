@@ -0,0 +1,83 @@
+"""
+tests.test_ratelimit
+"""
+
+import pytest
+
+from flask import url_for
+
+from flask_csp import utils
+from flask_csp.ratelimit import ReportLimiter, TokenBuckets
+
+
+@pytest.fixture()
+def limiter():
+    """Sets the receivers' rate limiter for a test"""
+
+    def set_limiter(**kwargs):
+        utils.LIMITER = ReportLimiter(**kwargs)
+        return utils.LIMITER
+
+    yield set_limiter
+    utils.LIMITER = None
+
+
+def test_token_buckets():
+    """Ensure that buckets allow bursts and refill at their rate"""
+
+    buckets = TokenBuckets(rate=2, burst=3, max_keys=2)
+
+    assert [buckets.take('a', now=0) for _ in range(4)] == [True, True, True, False]
+    assert buckets.take('a', now=0.25) is False
+    assert buckets.take('a', now=0.5) is True
+    assert buckets.take('b', now=0.5) is True
+
+    # The least recently used key is forgotten
+    buckets.take('c', now=0.5)
+    assert len(buckets) == 2
+    assert buckets.take('a', now=0.5) is True
+
+
+def test_limiter_keys(limiter):
+    """Ensure that clients and origins are limited separately"""
+
+    report_limiter = limiter(client_rate=0.001, client_burst=1, origin_rate=0.001, origin_burst=2)
+
+    def environ(addr, referer):
+        return {'REMOTE_ADDR': addr, 'HTTP_REFERER': referer}
+
+    assert report_limiter.allow(environ('10.0.0.1', 'https://a.example.com/page'))
+    assert not report_limiter.allow(environ('10.0.0.1', 'https://b.example.com/'))
+    assert report_limiter.allow(environ('10.0.0.2', 'https://a.example.com/other'))
+    assert not report_limiter.allow(environ('10.0.0.3', 'https://a.example.com/'))
+    assert report_limiter.allow({'REMOTE_ADDR': '10.0.0.4', 'HTTP_ORIGIN': 'https://b.example.com'})
+
+
+def test_limiter_sampling(limiter):
+    """Ensure that reports above the ceiling are sampled"""
+
+    report_limiter = limiter(ceiling=0.001, ceiling_burst=1, sample_rate=0.0)
+    assert [report_limiter.allow({}) for _ in range(3)] == [True, False, False]
+
+    report_limiter = limiter(ceiling=0.001, ceiling_burst=1, sample_rate=1.0)
+    assert [report_limiter.allow({}) for _ in range(3)] == [True, True, True]
+
+
+def test_limited_receiver(receiver_app, limiter, minimal_csp_report):
+    """Ensure that the receiver rejects reports above the limits before parsing them"""
+
+    limiter(client_rate=0.001, client_burst=2)
+
+    with receiver_app.app_context():
+        with receiver_app.test_client() as c:
+            statuses = [
+                c.post(url_for('csp.receiver'), json=minimal_csp_report,
+                       headers={'Content-Type': 'application/csp-report'}).status_code
+                for _ in range(3)
+            ]
+            assert statuses == [204, 204, 429]
+
+            # Not even an invalid body is read
+            rv = c.post(url_for('csp.receiver'), data='{',
+                        headers={'Content-Type': 'application/csp-report'})
+            assert rv.status_code == 429
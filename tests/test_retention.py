@@ -0,0 +1,139 @@
+"""
+tests.test_retention
+"""
+
+from datetime import timedelta
+
+import pytest
+
+from flask_csp.aggregate import utcnow
+
+sqlalchemy = pytest.importorskip('sqlalchemy')
+pytest.importorskip('flask_sqlalchemy')
+
+# The app's db, set on the sqlalchemy module by the conftest
+DB = sqlalchemy.db
+
+# pylint: disable=wrong-import-position
+from flask_csp.sqlalchemy import retention, views
+from flask_csp.sqlalchemy.models import CspReport, CspReportRollup
+
+
+@pytest.fixture()
+def db_app(sqlalchemy_app):
+    """Creates the app with an in-memory database of 10 daily reports and rollups"""
+
+    with sqlalchemy_app.app_context():
+        now = utcnow()
+        with DB.session.begin():
+            for days in range(10):
+                ts = now - timedelta(days=days)
+                DB.session.add(CspReport(
+                    ts=ts,
+                    blocked_uri='https://cdn.example.com/',
+                    disposition='enforce',
+                    document_uri='https://example.com/',
+                    original_policy="default-src 'self'",
+                ))
+                DB.session.add(CspReportRollup(
+                    hour=ts.replace(minute=0, second=0, microsecond=0),
+                    directive='img-src',
+                    blocked_origin='https://cdn.example.com',
+                    document_path='/',
+                    disposition='enforce',
+                    count=1,
+                ))
+
+    yield sqlalchemy_app
+
+
+def test_report_default_ts(db_app):
+    """Ensure that reports are stored with the UTC clock that retention compares to"""
+
+    with db_app.app_context():
+        before = utcnow()
+        with DB.session.begin():
+            DB.session.add(CspReport(
+                blocked_uri='inline',
+                disposition='enforce',
+                document_uri='https://example.com/',
+                original_policy="default-src 'self'",
+            ))
+
+        report = CspReport.query.filter_by(blocked_uri='inline').one()
+        assert before <= report.ts <= utcnow()
+
+
+def test_prune_reports_batches(db_app, monkeypatch):
+    """Ensure that old reports are deleted oldest first, in batches"""
+
+    pauses = []
+    monkeypatch.setattr(retention.time, 'sleep', pauses.append)
+
+    with db_app.app_context():
+        deleted = retention.prune_reports(DB, max_age=timedelta(days=2.5), batch_size=3, pause=0.5)
+        assert deleted == 7
+        assert CspReport.query.count() == 3
+
+        # 2 full batches, each followed by a pause, then the last report
+        assert pauses == [0.5, 0.5]
+
+        oldest = CspReport.query.order_by(CspReport.ts).first()
+        assert oldest.ts > utcnow() - timedelta(days=2.5)
+
+
+def test_prune_reports_max_rows(db_app):
+    """Ensure that only the newest max_rows reports are kept"""
+
+    with db_app.app_context():
+        newest = [report.id for report in CspReport.query.order_by(CspReport.ts.desc()).limit(4)]
+        DB.session.commit()
+
+        assert retention.prune_reports(DB, max_rows=4, batch_size=2) == 6
+        assert sorted(report.id for report in CspReport.query) == sorted(newest)
+
+        assert retention.prune_reports(DB) == 0
+
+
+def test_prune_rollups(db_app):
+    """Ensure that the rollups of the pruned hours are deleted, and max_rows ignored"""
+
+    with db_app.app_context():
+        assert retention.prune_rollups(DB, max_age=timedelta(days=2.5), batch_size=2) == 7
+        assert CspReportRollup.query.count() == 3
+
+        assert retention.prune_rollups(DB) == 0
+
+
+def test_prune_command(db_app):
+    """Ensure that the prune command deletes reports and rollups with the configured retention"""
+
+    db_app.config['CSP_REPORT_MAX_AGE'] = 5.5
+    runner = db_app.test_cli_runner()
+
+    result = runner.invoke(args=['csp', 'prune', '--batch-size', '2'])
+    assert result.exit_code == 0
+    assert result.output == 'Deleted 4 reports and 4 rollups\n'
+
+    result = runner.invoke(args=['csp', 'prune', '--max-rows', '1'])
+    assert result.exit_code == 0
+    assert result.output == 'Deleted 5 reports and 0 rollups\n'
+
+    with db_app.app_context():
+        assert CspReport.query.count() == 1
+        assert CspReportRollup.query.count() == 6
+
+
+def test_prune_command_errors(db_app, monkeypatch):
+    """Ensure that the prune command fails without a retention or a db"""
+
+    runner = db_app.test_cli_runner()
+
+    result = runner.invoke(args=['csp', 'prune'])
+    assert result.exit_code == 2
+    assert 'No retention set' in result.output
+
+    monkeypatch.setattr(views, 'DB', None)
+    result = runner.invoke(args=['csp', 'prune', '--max-rows', '1'])
+    assert result.exit_code == 1
+    assert 'flask_csp.sqlalchemy.views.DB is not set' in result.output
@@ -0,0 +1,153 @@
+"""
+tests.test_review
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from flask import template_rendered, url_for
+
+sqlalchemy = pytest.importorskip('sqlalchemy')
+pytest.importorskip('flask_sqlalchemy')
+
+# The app's db, set on the sqlalchemy module by the conftest
+DB = sqlalchemy.db
+
+# pylint: disable=wrong-import-position
+from flask_csp.sqlalchemy import views
+from flask_csp.sqlalchemy.models import CspReport
+
+START = datetime(2024, 5, 1, 12)
+
+
+@pytest.fixture()
+def review_app(sqlalchemy_app):
+    """
+    Creates the app with 6 reports, one a minute from START, the last 2 of
+    them sharing their time with the report before
+    """
+
+    with sqlalchemy_app.app_context():
+        with DB.session.begin():
+            for minutes, disposition, document_uri, blocked_uri, referrer in (
+                    (0, 'enforce', 'https://example.com/', 'inline', ''),
+                    (1, 'report', 'https://example.com/signup', 'https://cdn.example.com/a.js',
+                     'https://search.example.net/?q=signup'),
+                    (2, 'enforce', 'https://example.com/signup', 'https://cdn.example.com/b.js',
+                     'https://Search.example.net/'),
+                    (3, 'enforce', 'https://example.com/100%', 'eval', ''),
+                    (3, 'report', 'https://example.com/100_', 'eval', None),
+                    (3, 'enforce', 'https://example.com/', 'https://cdn.example.com/a.js', ''),
+            ):
+                DB.session.add(CspReport(
+                    ts=START + timedelta(minutes=minutes),
+                    disposition=disposition,
+                    document_uri=document_uri,
+                    blocked_uri=blocked_uri,
+                    referrer=referrer,
+                    original_policy="default-src 'self'",
+                ))
+
+    yield sqlalchemy_app
+
+
+def get_review(app, **args):
+    """Returns the status code, the ids of the listed reports and the next cursor of the review"""
+
+    rendered = []
+
+    def record(sender, template, context, **extra):  # pylint: disable=unused-argument
+        rendered.append(context)
+
+    with app.app_context():
+        with template_rendered.connected_to(record, app), app.test_client() as c:
+            rv = c.get(url_for('csp.review', **args))
+
+    if not rendered:
+        return rv.status_code, None, None
+
+    context = rendered[0]
+    return rv.status_code, [report.id for report in context['reports']], context['next_cursor']
+
+
+@pytest.mark.parametrize('args, ids', [
+    ({}, [6, 5, 4, 3, 2, 1]),
+    ({'disposition': 'report'}, [5, 2]),
+    ({'document-uri': 'https://example.com/signup'}, [3, 2]),
+    ({'document-uri': 'https://example.com/100%'}, [4]),
+    ({'blocked-uri': 'https://cdn.example.com/'}, [6, 3, 2]),
+    ({'referrer': 'search.example'}, [3, 2]),
+    ({'after': '2024-05-01T12:02:00'}, [6, 5, 4, 3]),
+    ({'before': '2024-05-01 12:01'}, [2, 1]),
+    ({'after': '2024-05-01T12:01', 'before': '2024-05-01T12:02', 'disposition': 'enforce'}, [3]),
+    ({'disposition': '', 'spam': 'eggs'}, [6, 5, 4, 3, 2, 1]),
+])
+def test_review_filters(review_app, args, ids):
+    """Ensure that the review lists the matching reports, newest first"""
+
+    assert get_review(review_app, **args) == (200, ids, None)
+
+
+def test_review_cursor(review_app):
+    """Ensure that the pages follow each other, including across reports of the same time"""
+
+    assert get_review(review_app, per_page=2) == (200, [6, 5], '2024-05-01T12:03:00_5')
+    assert get_review(review_app, per_page=2, cursor='2024-05-01T12:03:00_5') == \
+        (200, [4, 3], '2024-05-01T12:02:00_3')
+    assert get_review(review_app, per_page=2, cursor='2024-05-01T12:02:00_3') == \
+        (200, [2, 1], None)
+
+    # The filters still apply to the next pages
+    assert get_review(review_app, per_page=1, disposition='report') == \
+        (200, [5], '2024-05-01T12:03:00_5')
+    assert get_review(review_app, per_page=1, disposition='report',
+                      cursor='2024-05-01T12:03:00_5') == (200, [2], None)
+
+
+def test_review_links(review_app):
+    """Ensure that the link to the next page keeps the filters"""
+
+    with review_app.app_context():
+        with review_app.test_client() as c:
+            rv = c.get(url_for('csp.review', per_page=1, disposition='report', spam='eggs'))
+
+    assert rv.status_code == 200
+    assert b'cursor=2024-05-01T12:03:00_5' in rv.data
+    assert b'disposition=report' in rv.data
+    assert b'per_page=1' in rv.data
+    assert b'spam' not in rv.data
+
+
+@pytest.mark.parametrize('per_page, count', [
+    (None, 2),
+    (0, 2),
+    (-3, 1),
+    ('many', 2),
+    (3, 3),
+    (10, 4),
+])
+def test_review_per_page(review_app, monkeypatch, per_page, count):
+    """Ensure that the page size defaults to and is clamped within the configured sizes"""
+
+    monkeypatch.setattr(views, 'REVIEW_PAGE_SIZE', 2)
+    monkeypatch.setattr(views, 'REVIEW_MAX_PAGE_SIZE', 4)
+
+    args = {} if per_page is None else {'per_page': per_page}
+    status_code, ids, next_cursor = get_review(review_app, **args)
+    assert status_code == 200
+    assert len(ids) == count
+    assert next_cursor is not None
+
+
+@pytest.mark.parametrize('args', [
+    {'after': 'yesterday'},
+    {'before': '2024-13-01'},
+    {'cursor': 'nope'},
+    {'cursor': '2024-05-01T12:03:00'},
+    {'cursor': '2024-05-01T12:03:00_five'},
+])
+def test_review_bad_values(review_app, args):
+    """Ensure that unparsable dates and cursors are rejected"""
+
+    assert get_review(review_app, **args) == (400, None, None)
@@ -0,0 +1,207 @@
+"""
+tests.test_rollups
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from flask import template_rendered, url_for
+
+from flask_csp.aggregate import utcnow
+
+sqlalchemy = pytest.importorskip('sqlalchemy')
+pytest.importorskip('flask_sqlalchemy')
+
+# The app's db, set on the sqlalchemy module by the conftest
+DB = sqlalchemy.db
+
+# pylint: disable=wrong-import-position
+from sqlalchemy.orm import Query  # pylint: disable=import-error
+
+from flask_csp.sqlalchemy import views
+from flask_csp.sqlalchemy.models import CspReport, CspReportRollup
+from flask_csp.sqlalchemy.rollups import get_rollup_key, update_rollups
+
+
+@pytest.fixture()
+def rollups_app(sqlalchemy_app, monkeypatch):
+    """Creates the app with the rollups updated by the receiver"""
+
+    monkeypatch.setattr(views, 'ROLLUPS', True)
+    yield sqlalchemy_app
+
+
+def add_rollup(hour, blocked_origin, count, directive='img-src'):
+    """Adds a rollup of the page `/` to the current session"""
+
+    DB.session.add(CspReportRollup(
+        hour=hour,
+        directive=directive,
+        blocked_origin=blocked_origin,
+        document_path='/',
+        disposition='enforce',
+        count=count,
+    ))
+
+
+@pytest.mark.parametrize('row, key', [
+    (
+        {
+            'ts': datetime(2024, 5, 1, 10, 42, 7, 15),
+            'effective_directive': 'script-src-elem',
+            'violated_directive': 'script-src',
+            'blocked_uri': 'https://cdn.example.com:8443/lib.js?v=2',
+            'document_uri': 'https://example.com/signup?next=%2F',
+            'disposition': 'enforce',
+        },
+        (datetime(2024, 5, 1, 10), 'script-src-elem', 'https://cdn.example.com:8443', '/signup',
+         'enforce'),
+    ),
+    (
+        {
+            'violated_directive': "style-src 'self' cdn.example.com",
+            'blocked_uri': 'inline',
+            'document_uri': 'https://example.com',
+            'disposition': 'report',
+        },
+        (datetime(2024, 5, 1, 11), 'style-src', 'inline', '/', 'report'),
+    ),
+    (
+        {'blocked_uri': 'data:image/png;base64,AAAA'},
+        (datetime(2024, 5, 1, 11), '', 'data', '/', ''),
+    ),
+])
+def test_get_rollup_key(row, key):
+    """Ensure that reports are counted by hour, bare directive, blocked origin and document path"""
+
+    assert get_rollup_key(row, now=datetime(2024, 5, 1, 11, 59)) == key
+
+
+def test_update_rollups(rollups_app, batched_reports):
+    """Ensure that the receiver inserts the rollups of new reports, then updates them"""
+
+    with rollups_app.app_context():
+        with rollups_app.test_client() as c:
+            for _ in range(3):
+                rv = c.post(url_for('csp.receiver'), json=batched_reports,
+                            headers={'Content-Type': 'application/reports+json'})
+                assert rv.status_code == 204
+
+        assert CspReport.query.count() == 6
+
+        hour = utcnow().replace(minute=0, second=0, microsecond=0)
+        rollups = CspReportRollup.query.order_by(CspReportRollup.directive).all()
+        assert [
+            (rollup.hour, rollup.directive, rollup.blocked_origin, rollup.document_path,
+             rollup.disposition, rollup.count)
+            for rollup in rollups
+        ] == [
+            (hour, 'script-src-elem', 'https://cdn.example.com', '/signup.html', 'enforce', 3),
+            (hour, 'style-src-attr', 'inline', '/', 'report', 3),
+        ]
+
+
+def test_update_rollups_counts(sqlalchemy_app):
+    """Ensure that aggregated rows add their count, and rows of other hours their own rollup"""
+
+    now = utcnow()
+    row = {
+        'effective_directive': 'img-src',
+        'blocked_uri': 'https://cdn.example.com/a.png',
+        'document_uri': 'https://example.com/',
+        'disposition': 'enforce',
+    }
+
+    with sqlalchemy_app.app_context():
+        with DB.session.begin():
+            update_rollups(DB.session, [
+                dict(row, ts=now, count=4),
+                dict(row, ts=now),
+                dict(row, ts=now - timedelta(hours=1)),
+            ])
+
+        counts = sorted(rollup.count for rollup in CspReportRollup.query)
+        assert counts == [1, 5]
+
+
+def test_update_rollups_conflict(sqlalchemy_app, monkeypatch):
+    """Ensure that a rollup inserted by another worker meanwhile is updated instead"""
+
+    hour = utcnow().replace(minute=0, second=0, microsecond=0)
+    update = Query.update
+
+    def racing_update(query, values, **kwargs):
+        # The other worker inserts the rollup right after the first update missed it
+        monkeypatch.setattr(Query, 'update', update)
+        add_rollup(hour, 'https://cdn.example.com', 2)
+        DB.session.flush()
+        return 0
+
+    with sqlalchemy_app.app_context():
+        monkeypatch.setattr(Query, 'update', racing_update)
+        with DB.session.begin():
+            update_rollups(DB.session, [{
+                'ts': hour,
+                'effective_directive': 'img-src',
+                'blocked_uri': 'https://cdn.example.com/a.png',
+                'document_uri': 'https://example.com/',
+                'disposition': 'enforce',
+            }])
+
+        rollup = CspReportRollup.query.one()
+        assert rollup.count == 3
+
+
+@pytest.fixture()
+def summary_app(sqlalchemy_app):
+    """Creates the app with rollups of the current hour and of the previous days"""
+
+    hour = utcnow().replace(minute=0, second=0, microsecond=0)
+
+    with sqlalchemy_app.app_context():
+        with DB.session.begin():
+            add_rollup(hour, 'https://a.example.com', 2)
+            add_rollup(hour - timedelta(hours=3), 'https://b.example.com', 5)
+            add_rollup(hour - timedelta(hours=5), 'https://a.example.com', 1, directive='script-src')
+            add_rollup(hour - timedelta(hours=30), 'https://c.example.com', 50)
+
+    yield sqlalchemy_app
+
+
+def get_summary(app, **args):
+    """Returns the status code and the rows listed by the summary"""
+
+    rendered = []
+
+    def record(sender, template, context, **extra):  # pylint: disable=unused-argument
+        rendered.append(context)
+
+    with app.app_context():
+        with template_rendered.connected_to(record, app), app.test_client() as c:
+            rv = c.get(url_for('csp.summary', **args))
+
+    rows = [tuple(row) for row in rendered[0]['rows']] if rendered else None
+    return rv.status_code, rows
+
+
+@pytest.mark.parametrize('args, rows', [
+    ({}, [('https://b.example.com', 5, 0), ('https://a.example.com', 3, 2)]),
+    ({'sort': 'last_hour'}, [('https://a.example.com', 3, 2), ('https://b.example.com', 5, 0)]),
+    ({'hours': 4}, [('https://b.example.com', 5, 0), ('https://a.example.com', 2, 2)]),
+    ({'hours': 0}, [('https://b.example.com', 5, 0), ('https://a.example.com', 3, 2)]),
+    ({'hours': 48}, [('https://c.example.com', 50, 0), ('https://b.example.com', 5, 0),
+                     ('https://a.example.com', 3, 2)]),
+    ({'by': 'directive'}, [('img-src', 7, 2), ('script-src', 1, 0)]),
+    ({'by': 'document_path'}, [('/', 8, 2)]),
+])
+def test_summary(summary_app, args, rows):
+    """Ensure that the summary groups the rollups of the last hours"""
+
+    assert get_summary(summary_app, **args) == (200, rows)
+
+
+def test_summary_bad_group(summary_app):
+    """Ensure that the summary only groups by the rollup columns"""
+
+    assert get_summary(summary_app, by='count') == (400, None)
@@ -10,6 +10,9 @@ from flask import url_for
 csp_content_type = {  # pylint: disable=invalid-name
     'Content-Type': 'application/csp-report',
 }
+reports_content_type = {  # pylint: disable=invalid-name
+    'Content-Type': 'application/reports+json',
+}
 
 
 @pytest.mark.parametrize('headers, csp_report, status_code', [
@@ -19,6 +22,10 @@ csp_content_type = {  # pylint: disable=invalid-name
     ({}, pytest.lazy_fixture('full_csp_report'), 400,),
     (csp_content_type, {}, 400,),
     ({}, {}, 400,),
+    (reports_content_type, pytest.lazy_fixture('batched_reports'), 204,),
+    (reports_content_type, [], 204,),
+    (reports_content_type, pytest.lazy_fixture('minimal_csp_report'), 400,),
+    (csp_content_type, pytest.lazy_fixture('batched_reports'), 400,),
 ])
 def test_simple_submission(receiver_app, headers, csp_report, status_code):
     """Ensure that the simple CSP report receiver accepts reports"""
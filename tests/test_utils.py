@@ -0,0 +1,142 @@
+"""
+tests.test_utils
+"""
+
+import io
+import json
+
+import pytest
+
+from flask import url_for
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.test import EnvironBuilder
+
+from flask_csp.codec import ORJSON, JSONCodec, OrjsonCodec
+from flask_csp.utils import get_submitted_reports
+
+
+def test_batched_reports(base_app, batched_reports):
+    """Ensure that Reporting API batches are returned as csp-report objects"""
+
+    with base_app.test_request_context(
+            '/report', method='POST', data=json.dumps(batched_reports),
+            content_type='application/reports+json'):
+        csp_reports = get_submitted_reports()
+
+    assert csp_reports == [
+        {
+            'blocked-uri': 'https://cdn.example.com/script.js',
+            'column-number': 4,
+            'disposition': 'enforce',
+            'document-uri': 'https://example.com/signup.html',
+            'effective-directive': 'script-src-elem',
+            'line-number': 12,
+            'original-policy': "script-src 'self'; report-to csp-endpoint",
+            'referrer': '',
+            'source-file': 'https://example.com/signup.html',
+            'status-code': 200,
+            'violated-directive': 'script-src-elem',
+        },
+        {
+            'blocked-uri': 'inline',
+            'disposition': 'report',
+            'document-uri': 'https://example.com/',
+            'effective-directive': 'style-src-attr',
+            'original-policy': "style-src 'self'; report-to csp-endpoint",
+            'script-sample': 'color: red',
+            'status-code': 200,
+            'violated-directive': 'style-src-attr',
+        },
+    ]
+
+
+@pytest.mark.parametrize('codec', [
+    JSONCodec,
+    pytest.param(OrjsonCodec, marks=pytest.mark.skipif(not ORJSON, reason='orjson is not installed')),
+])
+def test_codec(codec):
+    """Ensure that the codecs decode bodies and encode compact log lines"""
+
+    codec = codec()
+
+    assert codec.loads(b'{"csp-report": {"a": 1}}') == {'csp-report': {'a': 1}}
+    assert codec.loads_array(b' [ 1 , {"a": [2, 3]} ,"x" ] ') == [1, {'a': [2, 3]}, 'x']
+    assert codec.loads_array(b'[]') == []
+    assert codec.dumps({'b': 1, 'a': [1, 2]}) == '{"a":[1,2],"b":1}'
+
+    for data in (b'{"a": 1}', b'', b'[1 2]', b'[1,]', b'[1', b'[{"a": }]', b'[1] x', b'[1][2]'):
+        with pytest.raises(ValueError):
+            codec.loads_array(data)
+
+
+@pytest.mark.parametrize('max_size, status_code', [
+    (None, 204),
+    (16, 413),
+    (0, 204),
+])
+def test_report_max_size(receiver_app, minimal_csp_report, max_size, status_code):
+    """Ensure that reports larger than the maximum size are rejected"""
+
+    if max_size is not None:
+        receiver_app.config['CSP_REPORT_MAX_SIZE'] = max_size
+
+    with receiver_app.app_context():
+        with receiver_app.test_client() as c:
+            rv = c.post(url_for('csp.receiver'), data=json.dumps(minimal_csp_report),
+                        headers={'Content-Type': 'application/csp-report'})
+            assert rv.status_code == status_code
+
+
+def test_report_max_size_without_content_length(receiver_app, minimal_csp_report):
+    """Ensure that bodies without a Content-Length are not read past the maximum size"""
+
+    receiver_app.config['CSP_REPORT_MAX_SIZE'] = 16
+
+    builder = EnvironBuilder(
+        path='/report',
+        method='POST',
+        input_stream=io.BytesIO(json.dumps(minimal_csp_report).encode('utf-8')),
+        content_type='application/csp-report',
+    )
+    environ = builder.get_environ()
+    del environ['CONTENT_LENGTH']
+    environ['wsgi.input_terminated'] = True
+
+    with receiver_app.request_context(environ):
+        with pytest.raises(RequestEntityTooLarge):
+            get_submitted_reports()
+
+
+class ShortReadStream(io.BytesIO):
+    """Returns at most 8 bytes per read, as sockets may"""
+
+    def read(self, size=-1):
+        return super().read(8 if size is None or size < 0 else min(size, 8))
+
+
+@pytest.mark.parametrize('max_size, status_code', [
+    (4096, None),
+    (16, 413),
+])
+def test_report_max_size_short_reads(receiver_app, minimal_csp_report, max_size, status_code):
+    """Ensure that the body is read until its end or past the maximum size"""
+
+    receiver_app.config['CSP_REPORT_MAX_SIZE'] = max_size
+
+    builder = EnvironBuilder(
+        path='/report',
+        method='POST',
+        input_stream=ShortReadStream(json.dumps(minimal_csp_report).encode('utf-8')),
+        content_type='application/csp-report',
+    )
+    environ = builder.get_environ()
+    del environ['CONTENT_LENGTH']
+    environ['wsgi.input_terminated'] = True
+
+    with receiver_app.request_context(environ):
+        if status_code is None:
+            assert get_submitted_reports() == [minimal_csp_report['csp-report']]
+
+        else:
+            with pytest.raises(RequestEntityTooLarge):
+                get_submitted_reports()
@@ -0,0 +1,118 @@
+"""
+tests.test_writer
+"""
+
+import contextlib
+import threading
+import time
+
+import pytest
+
+from flask_csp.metrics import METRICS
+from flask_csp.sqlalchemy.writer import DROP_NEWEST, DROP_OLDEST, REJECT, ReportWriter
+
+
+class FakeSession:
+    """Records the rows inserted in each transaction"""
+
+    def __init__(self):
+        self.batches = []
+        self.inserted = threading.Event()
+
+    @contextlib.contextmanager
+    def begin(self):
+        yield
+
+    def bulk_insert_mappings(self, model, rows):
+        self.batches.append([row['id'] for row in rows])
+        self.inserted.set()
+
+
+class FakeDB:  # pylint: disable=too-few-public-methods
+    def __init__(self):
+        self.session = FakeSession()
+
+
+@pytest.fixture()
+def db():
+    return FakeDB()
+
+
+@pytest.fixture()
+def metrics():
+    """Enables the metrics for a test"""
+
+    METRICS.clear()
+    METRICS.enable()
+    yield METRICS
+    METRICS.enable(False)
+    METRICS.clear()
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('Timed out')
+        time.sleep(0.005)
+
+
+def test_writer_batches(base_app, db):
+    """Ensure that full batches are written right away, and the rest on stop"""
+
+    writer = ReportWriter(base_app, db, None, batch_size=3, flush_interval=60).start()
+    for row_id in range(7):
+        writer.submit({'id': row_id})
+
+    wait_for(lambda: len(db.session.batches) == 2)
+    assert writer.queued() == 1
+
+    writer.stop()
+    assert db.session.batches == [[0, 1, 2], [3, 4, 5], [6]]
+    assert writer.queued() == 0
+
+
+def test_writer_flush_interval(base_app, db):
+    """Ensure that partial batches are written once the flush interval passes"""
+
+    writer = ReportWriter(base_app, db, None, batch_size=100, flush_interval=0.05).start()
+    start = time.monotonic()
+    writer.submit({'id': 0})
+    writer.submit({'id': 1})
+
+    assert db.session.inserted.wait(2.0)
+    assert time.monotonic() - start >= 0.05
+    assert db.session.batches == [[0, 1]]
+    writer.stop()
+
+
+def test_writer_flush_interval_after_batch(base_app, db):
+    """Ensure that rows left after a batch keep the deadline they were queued with"""
+
+    writer = ReportWriter(base_app, db, None, batch_size=2, flush_interval=60)
+    for row_id in range(3):
+        writer.submit({'id': row_id})
+
+    with writer._condition:  # pylint: disable=protected-access
+        writer.take_batch()
+        writer._queue[0] = (time.monotonic() - 61, writer._queue[0][1])  # pylint: disable=protected-access
+        assert writer.get_timeout() == 0
+
+
+@pytest.mark.parametrize('drop_policy, accepted, queued', [
+    (DROP_NEWEST, False, [0, 1]),
+    (DROP_OLDEST, True, [1, 2]),
+    (REJECT, False, [0, 1]),
+])
+def test_writer_overflow(base_app, db, metrics, drop_policy, accepted, queued):
+    """Ensure that the drop policy applies when the queue is full"""
+
+    writer = ReportWriter(base_app, db, None, batch_size=2, max_queued=2, drop_policy=drop_policy)
+
+    assert writer.submit({'id': 0}) is True
+    assert writer.submit({'id': 1}) is True
+    assert writer.submit({'id': 2}) is accepted
+    assert metrics.snapshot()['flask_csp_reports_dropped_total'] == {(): 1}
+
+    writer.stop()
+    assert db.session.batches == [queued]